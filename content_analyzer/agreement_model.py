@@ -0,0 +1,123 @@
+"""
+Lightweight local agreement classifier.
+
+Documents are turned into hashed unigram and bigram features (signed
+feature hashing into N_FEATURES buckets, log-scaled counts, L2-normalised)
+and scored by a logistic-regression weight vector stored as a NumPy array.
+The model is trained offline by train_classifier.py and loaded once at
+start-up; classify_agreement falls back to the keyword heuristic when no
+model file is present.
+"""
+import os
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+N_FEATURES = 2 ** 18
+# Only the start of very long documents is featurised
+MAX_CHARS = 100000
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "models", "agreement_classifier.npz")
+
+
+def features(text, n_features=N_FEATURES):
+    """
+    Hashed feature indices and values for one document
+    """
+    tokens = TOKEN_RE.findall((text or "")[:MAX_CHARS].lower())
+    grams = Counter(tokens)
+    grams.update(a + " " + b for a, b in zip(tokens, tokens[1:]))
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                         dtype=np.int64, count=len(grams))
+    counts = np.fromiter(grams.values(), dtype=np.float64, count=len(grams))
+    # The top hash bit picks the sign so collisions tend to cancel out
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    values = signs * np.log1p(counts)
+    index = hashes % n_features
+    # Merge buckets hit by more than one gram
+    index, inverse = np.unique(index, return_inverse=True)
+    values = np.bincount(inverse, weights=values, minlength=len(index))
+    norm = np.linalg.norm(values)
+    return index, values / norm if norm else values
+
+
+def batch_features(texts, n_features=N_FEATURES):
+    """
+    Stack per-document features as (doc_ids, indices, values) arrays
+    """
+    doc_ids, indices, values = [], [], []
+    for i, text in enumerate(texts):
+        idx, val = features(text, n_features)
+        doc_ids.append(np.full(len(idx), i, dtype=np.int64))
+        indices.append(idx)
+        values.append(val)
+    if not texts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(doc_ids), np.concatenate(indices), np.concatenate(values)
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class AgreementModel:
+    def __init__(self, weights, bias=0.0, threshold=0.5, metadata=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+        self.metadata = metadata or {}
+
+    @property
+    def n_features(self):
+        return len(self.weights)
+
+    def decision(self, doc_ids, indices, values, n_docs):
+        return np.bincount(doc_ids, weights=self.weights[indices] * values,
+                           minlength=n_docs) + self.bias
+
+    def predict_proba(self, texts):
+        """
+        Probability that each text is an agreement, as an array
+        """
+        texts = list(texts)
+        doc_ids, indices, values = batch_features(texts, self.n_features)
+        return sigmoid(self.decision(doc_ids, indices, values, len(texts)))
+
+    def predict(self, texts):
+        return self.predict_proba(texts) >= self.threshold
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, threshold=self.threshold,
+            metadata=np.array([repr(self.metadata)]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            metadata = {"path": path, "trained": str(data["metadata"][0])}
+            return cls(data["weights"], float(data["bias"]), float(data["threshold"]), metadata)
+
+
+def load_model(path=None):
+    """
+    Load the trained model, or return None (heuristic fallback) if there is
+    no model file or it cannot be read
+    """
+    path = path or os.environ.get("AGREEMENT_MODEL_PATH", DEFAULT_MODEL_PATH)
+    if not os.path.exists(path):
+        print(f"No agreement model at {path} - using keyword heuristic")
+        return None
+    try:
+        model = AgreementModel.load(path)
+        print(f"Loaded agreement model from {path}")
+        return model
+    except Exception as e:
+        print(f"Agreement model load failed: {e} - using keyword heuristic")
+        return None
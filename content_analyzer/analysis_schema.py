@@ -0,0 +1,83 @@
+"""
+The 12-category analysis schema returned by analyze_legal_document.
+
+FIELD_EXAMPLES mirrors the schema in the analysis prompt and is used to ask
+the model again for just the fields a response was missing. validate()
+keeps the fields of a (possibly repaired) model response that have the
+expected shape.
+"""
+
+FIELD_EXAMPLES = {
+    "summary": "Brief 2-3 sentence overview of the entire document",
+    "key_terms": [{"term": "Defined term", "definition": "Clear definition from the document"}],
+    "main_clauses": [{"name": "Clause name/title",
+                      "description": "Brief description of what this clause covers"}],
+    "critical_dates": [{"date": "YYYY-MM-DD or date range", "event": "What happens on this date"}],
+    "parties": [{"name": "Party name", "role": "Their role in the agreement"}],
+    "jurisdiction": "Governing law and jurisdiction information",
+    "obligations": [{"party": "Which party", "responsibility": "What they must do"}],
+    "risks": [{"risk": "Identified risk", "severity": "high/medium/low",
+               "description": "Explanation of the risk"}],
+    "recommendations": ["Actionable recommendation to address identified issues"],
+    "missing_clauses": [{"clause": "Missing clause name", "importance": "Why it's important"}],
+    "compliance_issues": [{"issue": "Compliance concern",
+                           "regulation": "Relevant law/regulation (if identifiable)"}],
+    "next_steps": ["Action item that should be taken next"],
+}
+
+# The categories in prompt order
+ANALYSIS_FIELDS = list(FIELD_EXAMPLES)
+
+# Entry fields identifying the same item, per list category (empty for
+# lists of strings)
+IDENTITY_FIELDS = {
+    "key_terms": ("term",),
+    "main_clauses": ("name",),
+    "critical_dates": ("date", "event"),
+    "parties": ("name",),
+    "obligations": ("party", "responsibility"),
+    "risks": ("risk",),
+    "missing_clauses": ("clause",),
+    "compliance_issues": ("issue",),
+    "recommendations": (),
+    "next_steps": (),
+}
+
+
+def empty_value(field):
+    return "" if isinstance(FIELD_EXAMPLES[field], str) else []
+
+
+def validate(fields):
+    """
+    Split parsed fields into (valid, invalid_names). String fields must be
+    strings and list fields lists; list entries without the expected shape
+    are dropped. Fields outside the schema are ignored.
+    """
+    valid, invalid = {}, []
+    for name, value in fields.items():
+        if name not in FIELD_EXAMPLES:
+            continue
+        if isinstance(FIELD_EXAMPLES[name], str):
+            if isinstance(value, str):
+                valid[name] = value
+            else:
+                invalid.append(name)
+            continue
+        if not isinstance(value, list):
+            invalid.append(name)
+            continue
+        identity = IDENTITY_FIELDS[name]
+        if identity:
+            valid[name] = [item for item in value
+                           if isinstance(item, dict) and any(item.get(f) for f in identity)]
+        else:
+            valid[name] = [item for item in value if isinstance(item, str) and item.strip()]
+    return valid, invalid
+
+
+def complete(fields):
+    """
+    Analysis in schema order, with empty values for any missing field
+    """
+    return {name: fields.get(name, empty_value(name)) for name in ANALYSIS_FIELDS}
@@ -1,17 +1,33 @@
 import io
-import re
-import pdfplumber
 import docx
-import pytesseract
-import fitz
-from PIL import Image
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from reportlab.platypus import SimpleDocTemplate, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
 import json
+import math
 import os
 from datetime import datetime
+import tempfile
+import time
 import textwrap
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+import pdf_engine
+import docx_stream
+import upload_spool
+import image_engine
+import long_document
+import prompt_budget
+import text_normalize
+from cue_matcher import CueMatcher
+import agreement_model
+from cache_store import TieredCache, MemoryLRU, DiskStore, build_cache, content_key
+from single_flight import SingleFlight
+from model_client import (AsyncModelClient, CircuitBreaker, CircuitOpen, ModelUnavailable, RateLimited,
+                          gemini_call, gemini_stream, http_call, http_stream)
+import json_stream
+import analysis_schema
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-flash-latest")
 
 # Try to import Google AI Studio SDK
 try:
@@ -24,7 +40,7 @@ try:
     if API_KEY:
         genai.configure(api_key=API_KEY)
         # Use gemini-flash-latest as gemini-1.5-flash is not available
-        model = genai.GenerativeModel("gemini-flash-latest")
+        model = genai.GenerativeModel(GEMINI_MODEL)
         AI_MODE = "STUDIO"
         print("="*60)
         print("AI MODE ENABLED - Using Google AI Studio")
@@ -43,13 +59,129 @@ except Exception as e:
     model = None
     print(f"AI initialization failed: {e}")
 
+# Optional local stand-in for Gemini (stub_model_server.py) for offline testing
+MODEL_STUB_URL = os.environ.get("MODEL_STUB_URL", "").strip()
+if MODEL_STUB_URL:
+    AI_MODE = "STUB"
+    model_call, model_stream = http_call(MODEL_STUB_URL), http_stream(MODEL_STUB_URL)
+    print(f"Using stub model server at {MODEL_STUB_URL}")
+elif model is not None:
+    model_call, model_stream = gemini_call(model), gemini_stream(model)
+else:
+    model_call = model_stream = None
+# Part of the analysis cache key, so stub results never pass for Gemini ones
+MODEL_NAME = f"stub:{MODEL_STUB_URL}" if MODEL_STUB_URL else GEMINI_MODEL
+
 # Flask app
 app = Flask(__name__)
+# Spool large uploads to named temp files so extractors can map them by path
+app.request_class = upload_spool.SpooledRequest
 
 # Google Cloud configuration
 GOOGLE_CLOUD_PROJECT = os.environ.get("GOOGLE_CLOUD_PROJECT", "your-google-cloud-project-id")
 GOOGLE_CLOUD_LOCATION = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
 
+# Extraction cache: per-worker LRU in front of a compressed on-disk tier
+# shared by all gunicorn workers. Bump EXTRACTOR_VERSION whenever extraction
+# output changes so stale text is not served.
+EXTRACTOR_VERSION = "7"
+EXTRACT_CACHE_ENTRIES = int(os.environ.get("EXTRACT_CACHE_ENTRIES", 64))
+EXTRACT_CACHE_DIR = os.environ.get(
+    "EXTRACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "legalklarity", "extract"))
+EXTRACT_CACHE_DISK_MB = int(os.environ.get("EXTRACT_CACHE_DISK_MB", 256))
+
+extract_cache = TieredCache(
+    memory=MemoryLRU(EXTRACT_CACHE_ENTRIES),
+    disk=DiskStore(EXTRACT_CACHE_DIR, EXTRACT_CACHE_DISK_MB * 1024 * 1024) if EXTRACT_CACHE_DIR else None
+)
+
+# Analysis cache: model results keyed on the normalized document text,
+# document type, prompt version and model name. Bump ANALYSIS_PROMPT_VERSION
+# whenever the prompt or generation settings change. Backend is "tiered"
+# (per-worker LRU plus shared disk), "memory", "disk" or "none".
+ANALYSIS_PROMPT_VERSION = "2"
+ANALYSIS_CACHE_BACKEND = os.environ.get("ANALYSIS_CACHE_BACKEND", "tiered")
+ANALYSIS_CACHE_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_ENTRIES", 256))
+ANALYSIS_CACHE_DIR = os.environ.get(
+    "ANALYSIS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "legalklarity", "analysis"))
+ANALYSIS_CACHE_DISK_MB = int(os.environ.get("ANALYSIS_CACHE_DISK_MB", 128))
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+
+analysis_cache = build_cache(
+    ANALYSIS_CACHE_BACKEND, ANALYSIS_CACHE_ENTRIES, ANALYSIS_CACHE_DIR,
+    ANALYSIS_CACHE_DISK_MB * 1024 * 1024, ttl=ANALYSIS_CACHE_TTL or None
+)
+
+# Identical extractions and analyses running at the same time are coalesced
+# into one, within a worker and across workers through lock files
+SINGLE_FLIGHT_DIR = os.environ.get(
+    "SINGLE_FLIGHT_DIR", os.path.join(tempfile.gettempdir(), "legalklarity", "locks"))
+flights = SingleFlight(SINGLE_FLIGHT_DIR or None)
+
+# Batch analysis: files handled concurrently per request
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 4))
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 50))
+
+# Model client: all model calls in a worker share one async client with a
+# cap on calls in flight and per-minute request/token buckets. The limits
+# are per worker process.
+MODEL_CONCURRENCY = int(os.environ.get("MODEL_CONCURRENCY", 4))
+MODEL_RPM = int(os.environ.get("MODEL_RPM", 60))
+MODEL_TPM = int(os.environ.get("MODEL_TPM", 1000000))
+MODEL_MAX_RETRIES = int(os.environ.get("MODEL_MAX_RETRIES", 5))
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+
+# Circuit breaker: after MODEL_BREAKER_FAILURES failed or slower than
+# MODEL_SLOW_CALL_S calls in a row, model calls are skipped for
+# MODEL_BREAKER_RESET_S seconds and requests get the local analysis. Calls
+# are streamed, so MODEL_SLOW_CALL_S is the time to the first piece, not to
+# a full response.
+MODEL_BREAKER_FAILURES = int(os.environ.get("MODEL_BREAKER_FAILURES", 5))
+MODEL_SLOW_CALL_S = float(os.environ.get("MODEL_SLOW_CALL_S", 30))
+MODEL_BREAKER_RESET_S = float(os.environ.get("MODEL_BREAKER_RESET_S", 30))
+
+model_client = AsyncModelClient(
+    model_call, concurrency=MODEL_CONCURRENCY, requests_per_minute=MODEL_RPM,
+    tokens_per_minute=MODEL_TPM, max_retries=MODEL_MAX_RETRIES, stream_call=model_stream,
+    breaker=CircuitBreaker(MODEL_BREAKER_FAILURES, MODEL_SLOW_CALL_S, MODEL_BREAKER_RESET_S)
+) if model_call else None
+
+# Seconds from the start of an analysis request after which the local
+# analysis is returned instead of waiting on the model (0 disables); keep it
+# below the gunicorn --timeout of 120. A model call is not started with less
+# than MODEL_MIN_CALL_S left.
+ANALYSIS_DEADLINE_S = float(os.environ.get("ANALYSIS_DEADLINE_S", 90))
+MODEL_MIN_CALL_S = float(os.environ.get("MODEL_MIN_CALL_S", 5))
+
+# Characters of document text per analysis window
+ANALYSIS_TEXT_LIMIT = 50000
+# Estimated tokens of document text per prompt; a longer window keeps its
+# most salient sections (see prompt_budget) instead of its first characters
+ANALYSIS_TOKEN_BUDGET = int(os.environ.get("ANALYSIS_TOKEN_BUDGET", 16000))
+# Longer documents are split at clause boundaries into up to this many
+# segments of at most ANALYSIS_TEXT_LIMIT characters, analyzed in parallel
+# and merged (1 keeps a single packed window)
+ANALYSIS_MAX_SEGMENTS = int(os.environ.get("ANALYSIS_MAX_SEGMENTS", 8))
+# Follow-up model calls asking only for the fields a response was missing,
+# or had cut off at the output token limit
+ANALYSIS_REPAIR_ROUNDS = int(os.environ.get("ANALYSIS_REPAIR_ROUNDS", 1))
+
+# Characters each analysis mode needs; PDF extraction stops reading pages
+# once this much text has been collected (None reads the whole document)
+EXTRACTION_BUDGETS = {
+    "analysis": ANALYSIS_TEXT_LIMIT * max(1, ANALYSIS_MAX_SEGMENTS),
+    "classify": 20000,
+}
+
+# Strip running headers, footers and page numbers, rejoin hyphenated words
+# and collapse whitespace in extracted text (see text_normalize)
+TEXT_NORMALIZE = os.environ.get("TEXT_NORMALIZE", "1").lower() not in ("0", "false", "no", "off")
+
 # Section cues to check for agreements
 POSITIVE_LABELS = [
     "agreement", "legal contract", "rental agreement", "lease agreement",
@@ -79,10 +211,31 @@ def chunk_text(text, max_words=300, max_chunks=10):
     chunks = [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
     return chunks[:max_chunks]
 
+CUE_MATCHER = CueMatcher(SECTION_CUES)
+
+# Salience cues for packing prompts: the section cues plus clauses that sit
+# late in a contract and must survive the token budget (matched as word
+# prefixes, so "terminat" covers "terminate" and "termination")
+PROMPT_CUES = SECTION_CUES + [
+    "terminat", "governing", "signature", "signed", "in witness", "indemn",
+    "liabilit", "confidential", "dispute", "penalt", "late fee", "renewal",
+    "force majeure", "notice", "effective date", "term"
+]
+PROMPT_MATCHER = CueMatcher(PROMPT_CUES, prefix=True)
+
+def pack_for_prompt(text, budget=ANALYSIS_TOKEN_BUDGET, query=None, report=None):
+    """
+    The most salient sections of text within `budget` estimated tokens; a
+    chat question passed as `query` favours the sections it mentions
+    """
+    return prompt_budget.pack(text, budget, PROMPT_MATCHER, query=query, report=report)
+
+# Optional trained classifier (train_classifier.py); None means keyword voting
+AGREEMENT_MODEL = agreement_model.load_model()
+
 def heuristic_score(text):
-    t = (text or "").lower()
-    found = sum(1 for k in SECTION_CUES if re.search(r"\b" + re.escape(k) + r"\b", t))
-    return found / max(1, len(SECTION_CUES))
+    # One scan for all cues; same \bcue\b semantics as a per-cue re.search
+    return CUE_MATCHER.score(text)
 
 def classify_agreement(text):
     details = {
@@ -96,60 +249,93 @@ def classify_agreement(text):
     if not text.strip():
         details["reason"] = "empty_text"
         return False, details
-    chunks = chunk_text(text, max_words=300, max_chunks=10)
-    details["chunks"] = len(chunks)
-    votes, per_chunk_scores = 0, []
+    # Simple keyword-based classification instead of ML model: one cue scan
+    # over the whole document, binned into 300-word chunks
+    per_chunk_scores, heur = CUE_MATCHER.chunk_scores(text, max_words=300)
     CHUNK_THRESHOLD = 0.5
-    for ch in chunks:
-        # Simple keyword-based classification instead of ML model
-        score = heuristic_score(ch)
-        per_chunk_scores.append(score)
-        if score >= CHUNK_THRESHOLD:
-            votes += 1
-    ratio = votes / len(chunks)
-    heur = heuristic_score(text)
+    votes = int((per_chunk_scores >= CHUNK_THRESHOLD).sum())
+    ratio = votes / len(per_chunk_scores)
     details.update({
+        "chunks": len(per_chunk_scores),
         "votes": votes,
         "vote_ratio": round(ratio, 3),
         "heuristic": round(heur, 3),
-        "avg_chunk_score": round(sum(per_chunk_scores) / max(1, len(per_chunk_scores)), 3)
+        "avg_chunk_score": round(float(per_chunk_scores.mean()), 3)
     })
     accept = (ratio >= 0.4) or (heur >= 0.4)
+    details["method"] = "heuristic"
+    # Prefer the trained classifier when one is installed; the keyword
+    # votes above stay in the details and are the fallback
+    if AGREEMENT_MODEL is not None:
+        try:
+            probability = float(AGREEMENT_MODEL.predict_proba([text])[0])
+            details["model_probability"] = round(probability, 3)
+            details["method"] = "model"
+            accept = probability >= AGREEMENT_MODEL.threshold
+        except Exception as e:
+            print(f"Agreement model error, using heuristic: {e}")
     if not accept:
         details["reason"] = "low_confidence"
     return accept, details
 
-# Document type detection
-def detect_document_type(text):
+# Document type detection. Each keyword lists its accepted forms as
+# "form|form", matched as whole words; the first names the keyword.
+DOCUMENT_TYPE_PATTERNS = {
+    "rental agreement": ["rent|rents|rental|rented", "lease|leases|leased|leasing",
+                         "tenant|tenants|tenancy", "landlord|landlords", "security deposit"],
+    "employment contract": ["employment", "employee|employees", "employer|employers",
+                            "salary|salaries", "position|positions"],
+    "service agreement": ["service|services", "provider|providers", "client|clients",
+                          "deliverable|deliverables"],
+    "loan agreement": ["loan|loans", "borrower|borrowers", "lender|lenders",
+                       "interest rate|interest rates"],
+    "nda": ["confidential|confidentiality", "non-disclosure", "secrecy"],
+    "purchase agreement": ["purchase|purchases|purchased", "buy|buys", "sell|sells",
+                           "buyer|buyers", "seller|sellers"],
+    "internship agreement": ["internship|internships", "intern|interns",
+                             "supervisor|supervisors", "internship period"]
+}
+
+GENERAL_DOCUMENT_TYPE = "general legal document"
+
+# Evidence score that counts as an even chance: a type's confidence is
+# score / (total score + this), so one stray keyword stays well below 1
+TYPE_EVIDENCE_PRIOR = float(os.environ.get("TYPE_EVIDENCE_PRIOR", 2))
+
+TYPE_MATCHER = CueMatcher(
+    [form for keywords in DOCUMENT_TYPE_PATTERNS.values() for k in keywords for form in k.split("|")])
+
+def rank_document_types(text):
+    """
+    Rank document types by keyword evidence from a single scan of the text.
+    Each type scores sum(log(1 + occurrences)) over its keywords, so
+    coverage of many keywords beats repetition of one. Confidence is the
+    type's share of the evidence, discounted by TYPE_EVIDENCE_PRIOR so
+    weak evidence reads as weak.
+    """
+    counts = TYPE_MATCHER.counts(text)
+    scored = []
+    for doc_type, keywords in DOCUMENT_TYPE_PATTERNS.items():
+        occurrences = {k.split("|")[0]: sum(counts[form] for form in k.split("|")) for k in keywords}
+        score = sum(math.log1p(n) for n in occurrences.values())
+        if score > 0:
+            matched = [k for k, n in occurrences.items() if n]
+            scored.append((doc_type, score, matched))
+    total = sum(score for _, score, _ in scored)
+    # Stable sort keeps the declaration order for ties, as max() did
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return [{
+        "type": doc_type,
+        "confidence": round(score / (total + TYPE_EVIDENCE_PRIOR), 3),
+        "keywords": matched
+    } for doc_type, score, matched in scored]
+
+def detect_document_type(text, ranking=None):
     """
     Enhanced document type detection
     """
-    text_lower = text.lower()
-    
-    # Document type patterns
-    patterns = {
-        "rental agreement": ["rent", "lease", "tenant", "landlord", "security deposit"],
-        "employment contract": ["employment", "employee", "employer", "salary", "position"],
-        "service agreement": ["service", "provider", "client", "deliverable"],
-        "loan agreement": ["loan", "borrower", "lender", "interest rate"],
-        "nda": ["confidential", "non-disclosure", "secrecy"],
-        "purchase agreement": ["purchase", "buy", "sell", "buyer", "seller"],
-        "internship agreement": ["internship", "intern", "supervisor", "internship period"]
-    }
-    
-    # Score each document type
-    scores = {}
-    for doc_type, keywords in patterns.items():
-        score = sum(1 for keyword in keywords if keyword in text_lower)
-        scores[doc_type] = score
-    
-    # Return highest scoring document type
-    if scores:
-        best_match = max(scores.items(), key=lambda x: x[1])
-        if best_match[1] > 0:
-            return best_match[0]
-    
-    return "general legal document"
+    ranking = rank_document_types(text) if ranking is None else ranking
+    return ranking[0]["type"] if ranking else GENERAL_DOCUMENT_TYPE
 
 # Fallback analysis function
 def create_fallback_analysis(text, document_type):
@@ -175,21 +361,238 @@ def create_fallback_analysis(text, document_type):
         "next_steps": ["Review document with legal counsel"]
     }
 
+def create_error_analysis(message):
+    """
+    Analysis structure returned when the model call fails
+    """
+    return {
+        "error": message,
+        "summary": "Document analysis could not be completed due to technical issues.",
+        "key_terms": [],
+        "main_clauses": [],
+        "critical_dates": [],
+        "parties": [],
+        "jurisdiction": "Not available",
+        "obligations": [],
+        "risks": [],
+        "recommendations": [],
+        "missing_clauses": [],
+        "compliance_issues": [],
+        "next_steps": []
+    }
+
+def analysis_key(text, document_type):
+    """
+    Cache key for a model analysis; whitespace differences between
+    extractions of the same document do not change it
+    """
+    normalized = " ".join(text.split())
+    return content_key(normalized.encode("utf-8"), document_type,
+                       ANALYSIS_PROMPT_VERSION, MODEL_NAME)
+
 # Enhanced document analysis function
-def analyze_legal_document(text, document_type=None):
+def analyze_legal_document(text, document_type=None, report=None, deadline=None):
     """
-    Comprehensive legal document analysis using Gemini AI
+    Comprehensive legal document analysis using Gemini AI.
+    The mode used (single, map_reduce or fallback) and segment counts are
+    written to `report` if given. `deadline` is the time.monotonic() by
+    which the result is needed; model calls that would run past it give way
+    to the local analysis.
     """
+    if report is None:
+        report = {}
+    report["chars"] = len(text)
     
     # Auto-detect document type if not provided
     if not document_type:
         document_type = detect_document_type(text)
     
     # If AI is not available, use fallback analysis
-    if AI_MODE == "NONE" or model is None:
+    if AI_MODE == "NONE" or model_client is None:
         print("Using fallback analysis - AI not available")
+        report.update({"mode": "fallback", "segments": 0})
         return create_fallback_analysis(text, document_type)
     
+    if len(text) > ANALYSIS_TEXT_LIMIT and ANALYSIS_MAX_SEGMENTS > 1:
+        return analyze_long_document(text, document_type, report, deadline)
+    report.update({"mode": "single", "segments": 1})
+    return analyze_window(text, document_type, report, deadline)
+
+def analyze_long_document(text, document_type, report, deadline=None):
+    """
+    Map-reduce analysis: every segment is analyzed as its own window in
+    parallel (so latency follows the longest segment) and the results are
+    merged category by category
+    """
+    packing = {}
+    packed = pack_for_prompt(text, ANALYSIS_TOKEN_BUDGET * ANALYSIS_MAX_SEGMENTS, report=packing)
+    # Each segment is packed again to ANALYSIS_TOKEN_BUDGET by analyze_window
+    segments = long_document.split_segments(packed, ANALYSIS_TEXT_LIMIT, ANALYSIS_MAX_SEGMENTS)
+    print(f"Map-reduce analysis over {len(segments)} segments")
+    segment_reports = [{} for _ in segments]
+    with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+        analyses = list(pool.map(
+            lambda segment, segment_report: analyze_window(segment, document_type, segment_report, deadline),
+            segments, segment_reports))
+    # Segments answered locally (deadline or open breaker) would only add
+    # raw document sentences to the merge
+    fallbacks = [r["fallback_reason"] for r in segment_reports if "fallback_reason" in r]
+    succeeded = [a for a, r in zip(analyses, segment_reports)
+                 if "error" not in a and "fallback_reason" not in r]
+    report.update({
+        "mode": "map_reduce",
+        "segments": len(segments),
+        "failed_segments": len(analyses) - len(succeeded),
+        "fallback_segments": len(fallbacks),
+        "packing": packing
+    })
+    if not succeeded:
+        if fallbacks:
+            report.update({"mode": "fallback", "fallback_reason": fallbacks[0]})
+            return create_fallback_analysis(text, document_type)
+        return analyses[0]
+    return long_document.merge_analyses(succeeded)
+
+def analyze_window(text, document_type, report=None, deadline=None):
+    """
+    Analysis of one window of text, packed to the token budget, served
+    from the cache when possible
+    """
+    text = window_text(text, report)
+    cache_key = analysis_key(text, document_type)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        print(f"Analysis cache hit {cache_key[:12]}")
+        return cached
+    
+    def generate():
+        flight_report = {}
+        analysis = generate_analysis(text, document_type, cache_key, flight_report, deadline)
+        return {"analysis": analysis, "report": flight_report}
+
+    def lookup():
+        analysis = analysis_cache.peek(cache_key)
+        return {"analysis": analysis, "report": {}} if analysis is not None else None
+
+    # Concurrent requests for the same document share one model call, and
+    # its report (recovery, fallback_reason)
+    result = flights.do("analysis-" + cache_key, generate, lookup)
+    if report is not None:
+        report.update(result["report"])
+    return result["analysis"]
+
+def window_text(text, report=None):
+    """
+    Text of one analysis window as sent to the model
+    """
+    packing = {}
+    text = pack_for_prompt(text, report=packing)
+    if report is not None:
+        report["packing"] = packing
+    return text
+
+def stream_analysis_events(text, document_type, report, deadline=None):
+    """
+    Generator of ("field", {"field", "value"}) events, each as soon as the
+    model has finished writing that top-level field, then one ("analysis",
+    analysis) event with the complete result. Cached, fallback and
+    map-reduce analyses are not streamed; their fields follow at once.
+    """
+    streamable = (AI_MODE != "NONE" and model_client is not None
+                  and (len(text) <= ANALYSIS_TEXT_LIMIT or ANALYSIS_MAX_SEGMENTS <= 1))
+    if streamable:
+        report.update({"chars": len(text), "mode": "single", "segments": 1})
+        text = window_text(text, report)
+        cache_key = analysis_key(text, document_type)
+        analysis = analysis_cache.get(cache_key)
+    else:
+        analysis = analyze_legal_document(text, document_type, report, deadline)
+    if analysis is not None:
+        for name, value in analysis.items():
+            yield "field", {"field": name, "value": value}
+        yield "analysis", analysis
+        return
+
+    report["streamed"] = True
+    fields = json_stream.TopLevelFields()
+    pieces, sent = [], {}
+    try:
+        prompt = build_analysis_prompt(text, document_type)
+        for piece in model_client.stream_sync(prompt, GENERATION_CONFIG, timeout=model_timeout(deadline)):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Analysis deadline reached while streaming")
+            pieces.append(piece)
+            for name, value in fields.feed(piece):
+                valid, _ = analysis_schema.validate({name: value})
+                if name in valid:
+                    sent[name] = valid[name]
+                    yield "field", {"field": name, "value": valid[name]}
+        analysis, missing = recover_analysis("".join(pieces), text, document_type, report, deadline)
+        if not missing:
+            analysis_cache.set(cache_key, analysis)
+    except Exception as e:
+        analysis = interrupted_analysis(e, "".join(pieces), text, document_type, report, deadline)
+        # Fields the client already has from the model are never replaced
+        # with fallback content
+        for name, value in sent.items():
+            if name in analysis:
+                analysis[name] = value
+    # Repaired fields, and any that differ from what was streamed
+    for name, value in analysis.items():
+        if name not in sent or sent[name] != value:
+            yield "field", {"field": name, "value": value}
+    yield "analysis", analysis
+
+def interrupted_analysis(error, response_text, text, document_type, report, deadline=None):
+    """
+    Analysis for a stream that failed part way: the fields recovered from
+    what was received, or failed_analysis if there are none. There are no
+    repair rounds when the model is out of time or unreachable.
+    """
+    print(f"Analysis stream interrupted: {error!r}")
+    report["stream_error"] = type(error).__name__
+    rounds = 0 if isinstance(error, (CircuitOpen, TimeoutError, FutureTimeout)) else ANALYSIS_REPAIR_ROUNDS
+    try:
+        analysis, _ = recover_analysis(response_text, text, document_type, report, deadline, rounds)
+        return analysis
+    except Exception:
+        return failed_analysis(error, text, document_type, report)
+
+def generate_analysis(text, document_type, cache_key, report=None, deadline=None):
+    """
+    Call Gemini for one document; complete results are cached
+    """
+    prompt = build_analysis_prompt(text, document_type)
+    
+    try:
+        if AI_MODE == "NONE" or model_client is None:
+            raise Exception("No AI model initialized")
+
+        # Generate response (concurrency and rate limits are shared by all
+        # requests in this worker)
+        response_text = model_client.generate_sync(prompt, GENERATION_CONFIG, timeout=model_timeout(deadline))
+        analysis, missing = recover_analysis(response_text, text, document_type, report, deadline)
+        # Only complete model results are cached; fallback and error
+        # payloads come from failed_analysis
+        if not missing:
+            analysis_cache.set(cache_key, analysis)
+        return analysis
+    except Exception as e:
+        return failed_analysis(e, text, document_type, report)
+
+def model_timeout(deadline):
+    """
+    Seconds a model call may take before `deadline` (None without one);
+    raises TimeoutError if too little time is left to start one
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining < MODEL_MIN_CALL_S:
+        raise TimeoutError("Analysis deadline too close for a model call")
+    return remaining
+
+def build_analysis_prompt(text, document_type):
     # Enhanced prompt engineering for comprehensive analysis
     prompt = f"""
     Analyze the following {document_type or 'legal document'} and provide a comprehensive analysis.
@@ -256,7 +659,7 @@ def analyze_legal_document(text, document_type=None):
     }}
     
     Document Text:
-    {text[:50000]}  # Limit to prevent token overflow
+    {text}
     
     Rules:
     - If information is not found, return an empty string ("") or empty list ([]).
@@ -265,60 +668,241 @@ def analyze_legal_document(text, document_type=None):
     - While generating each field, add more and more explanation and context to each field to ensure deep analysis.
     - Strictly return JSON with the specified fields and no additional fields.
     """
+    return prompt
+
+def build_fields_prompt(text, document_type, fields):
+    """
+    Prompt asking again for only the given analysis fields
+    """
+    schema = json.dumps({name: analysis_schema.FIELD_EXAMPLES[name] for name in fields}, indent=4)
+    return f"""
+    Analyze the following {document_type or 'legal document'} and provide only the fields below.
+    Return ONLY valid JSON that strictly matches this schema:
     
-    try:
-        if AI_MODE == "NONE" or model is None:
-            raise Exception("No AI model initialized")
+    {schema}
+    
+    Document Text:
+    {text}
+    
+    Rules:
+    - If information is not found, return an empty string ("") or empty list ([]).
+    - Do not include explanations outside the JSON.
+    - Keep responses concise and accessible for non-lawyers.
+    - Strictly return JSON with the specified fields and no additional fields.
+    """
 
-        # Generate response
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.4,
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 8192,
-            }
-        )
-        
-        # Clean response text (remove markdown code blocks)
-        response_text = response.text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        elif response_text.startswith("```"):
-            response_text = response_text[3:]
-        
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        response_text = response_text.strip()
-        
-        # Parse and validate JSON response
-        analysis = json.loads(response_text)
-        return analysis
-        
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing failed: {e}")
+def recover_analysis(response_text, text, document_type, report=None, deadline=None,
+                     rounds=ANALYSIS_REPAIR_ROUNDS):
+    """
+    Build the analysis from a model response, keeping every field that
+    parsed and matches the schema, including the complete part of one cut
+    off by the output token limit. Missing, invalid and cut-off fields are
+    requested again on their own, up to `rounds` times.
+
+    Returns (analysis, missing) where missing lists the fields that are
+    still empty or partial. Raises json.JSONDecodeError if no field could
+    be recovered at all.
+    """
+    fields, truncated = json_stream.recover_fields(response_text)
+    valid, _ = analysis_schema.validate(fields)
+    if not valid:
+        raise json.JSONDecodeError("No analysis fields could be recovered", response_text, 0)
+    missing = [name for name in analysis_schema.ANALYSIS_FIELDS
+               if name not in valid or name in truncated]
+    requested = list(missing)
+    
+    for _ in range(rounds):
+        if not missing:
+            break
+        print(f"Re-requesting analysis fields: {', '.join(missing)}")
+        try:
+            extra_text = model_client.generate_sync(
+                build_fields_prompt(text, document_type, missing), GENERATION_CONFIG,
+                timeout=model_timeout(deadline))
+        except Exception as e:
+            print(f"Field re-request failed: {e}")
+            break
+        extra, extra_truncated = json_stream.recover_fields(extra_text)
+        extra_valid, _ = analysis_schema.validate(extra)
+        for name in missing:
+            # A partial answer only replaces a field we have nothing for
+            if name in extra_valid and (name not in extra_truncated or name not in valid):
+                valid[name] = extra_valid[name]
+        missing = [name for name in missing if name not in extra_valid or name in extra_truncated]
+    
+    if requested and report is not None:
+        report["recovery"] = {
+            "truncated_fields": sorted(truncated),
+            "requested_fields": requested,
+            "missing_fields": missing
+        }
+    return analysis_schema.complete(valid), missing
+
+def failed_analysis(error, text, document_type, report=None):
+    """
+    Analysis returned in place of a failed model call
+    """
+    if isinstance(error, (CircuitOpen, TimeoutError, FutureTimeout)):
+        # The model is failing or out of time: answer locally now rather
+        # than hold the worker until gunicorn kills it
+        reason = "circuit_open" if isinstance(error, CircuitOpen) else "deadline"
+        print(f"Using fallback analysis ({reason}): {error!r}")
+        if report is not None:
+            report.update({"mode": "fallback", "fallback_reason": reason})
+        return create_fallback_analysis(text, document_type)
+    if isinstance(error, json.JSONDecodeError):
+        print(f"JSON parsing failed: {error}")
         # Fallback to basic analysis if JSON parsing fails
         return create_fallback_analysis(text, document_type)
+    if isinstance(error, RateLimited):
+        print(f"Model quota exhausted: {error}")
+        analysis = create_error_analysis("Model rate limit exceeded, please retry later")
+        analysis["retry_after"] = error.retry_after
+        return analysis
+    if isinstance(error, ModelUnavailable):
+        print(f"Model unavailable: {error}")
+        analysis = create_error_analysis("Model service unavailable, please retry later")
+        analysis["retry_after"] = error.retry_after
+        return analysis
+    print(f"Analysis failed: {error}")
+    return create_error_analysis(f"Analysis failed: {str(error)}")
+
+def upload_error(file):
+    """
+    Error message for a missing, empty or unsupported upload, else None
+    """
+    if file is None:
+        return "No file uploaded"
+    if file.filename == "":
+        return "No file selected"
+    if file_kind(file.filename) is None:
+        return "Unsupported file type"
+    return None
+
+def requested_text_engine():
+    """
+    PDF text engine named by the pdf_engine form field (None for default)
+    """
+    text_engine = request.form.get("pdf_engine", "").strip().lower() or None
+    if text_engine not in (None, "auto", *pdf_engine.TEXT_ENGINES):
+        raise ValueError(f"Unsupported pdf_engine: {text_engine}")
+    return text_engine
+
+def classify_document(text):
+    """
+    Agreement classification plus ranked document types, without the model
+    """
+    is_ok, details = classify_agreement(text)
+    # One keyword scan gives both the label and the ranked alternatives
+    document_types = rank_document_types(text)
+    return {
+        "is_agreement": is_ok,
+        "classification": details,
+        "document_type": detect_document_type(text, document_types),
+        "document_types": document_types
+    }
+
+# Fast classification route: extraction and keyword/model classification
+# only, so callers can reject non-agreements before paying for analysis
+@app.route("/classify", methods=["POST"])
+def classify():
+    start = time.perf_counter()
+    file = request.files.get("file")
+    error = upload_error(file)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        text_engine = requested_text_engine()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        kind = file_kind(file.filename)
+        text, extraction = extract_upload(
+            file.stream, kind, EXTRACTION_BUDGETS["classify"], text_engine)
+        result = classify_document(text)
+        print(f"Classified {file.filename}: {result['is_agreement']}, {result['document_type']}")
+        return jsonify({
+            "filename": file.filename,
+            **result,
+            "extraction": extraction,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
     except Exception as e:
-        print(f"Analysis failed: {e}")
-        # Return error structure
-        return {
-            "error": f"Analysis failed: {str(e)}",
-            "summary": "Document analysis could not be completed due to technical issues.",
-            "key_terms": [],
-            "main_clauses": [],
-            "critical_dates": [],
-            "parties": [],
-            "jurisdiction": "Not available",
-            "obligations": [],
-            "risks": [],
-            "recommendations": [],
-            "missing_clauses": [],
-            "compliance_issues": [],
-            "next_steps": []
-        }
+        print(f"Error in classify: {e}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+def analysis_deadline():
+    """
+    time.monotonic() by which an analysis started now must finish, or None
+    """
+    return time.monotonic() + ANALYSIS_DEADLINE_S if ANALYSIS_DEADLINE_S > 0 else None
+
+def analysis_options():
+    """
+    Request options for the analysis routes, read up front so worker
+    threads do not need the request context. The deadline runs from here,
+    so extraction time counts against it; batch files get their own.
+    """
+    return {
+        "deadline": analysis_deadline(),
+        "full_extraction": form_flag("full_extraction"),
+        "strict": form_flag("strict"),
+        "text_engine": requested_text_engine()
+    }
+
+def analyze_upload(file, options):
+    """
+    Extract, classify and analyze one uploaded file.
+    Returns (payload, status_code).
+    """
+    # Extract text (using existing functions)
+    kind = file_kind(file.filename)
+    print(f"Processing {kind.upper()} file")
+    # Only extract as much text as the analysis will use, unless the
+    # caller asks for the full document
+    full_extraction = options["full_extraction"]
+    char_budget = None if full_extraction else EXTRACTION_BUDGETS["analysis"]
+    text, extraction = extract_upload(file.stream, kind, char_budget, options["text_engine"])
+    extraction["full_extraction"] = full_extraction
+    
+    print(f"Extracted text length: {len(text)}")
+    
+    # Check if it's a valid agreement (using existing function)
+    result = classify_document(text)
+    print(f"Classification result: {result['is_agreement']}, Details: {result['classification']}")
+    print(f"Detected document type: {result['document_type']}")
+    
+    if not result["is_agreement"]:
+        # Strict mode skips the model call for documents that do not
+        # look like agreements
+        if options["strict"]:
+            print("Rejecting low confidence document (strict mode)")
+            return {
+                "error": "Document was not recognised as an agreement",
+                "filename": file.filename,
+                **result,
+                "extraction": extraction,
+                "timestamp": datetime.now().isoformat()
+            }, 422
+        print("Warning: Low confidence classification, proceeding anyway")
+    
+    # Perform enhanced analysis
+    print("Performing enhanced analysis")
+    analysis_report = {}
+    analysis = analyze_legal_document(text, result["document_type"], report=analysis_report,
+                                      deadline=options["deadline"])
+    print(f"Analysis completed: {analysis.get('summary', 'No summary')[:100]}...")
+    
+    return {
+        "filename": file.filename,
+        "extracted_text": text,
+        "extraction": extraction,
+        **result,
+        "analysis": analysis,
+        "analysis_report": analysis_report,
+        "timestamp": datetime.now().isoformat()
+    }, 200
 
 # Enhanced Flask route for document analysis
 @app.route("/enhanced_analysis", methods=["POST"])
@@ -328,105 +912,331 @@ def enhanced_document_analysis():
     """
     print("Received request to enhanced_analysis endpoint")
     
-    if "file" not in request.files:
-        print("No file uploaded")
-        return jsonify({"error": "No file uploaded"}), 400
-    
-    file = request.files["file"]
+    file = request.files.get("file")
+    error = upload_error(file)
+    if error:
+        print(error)
+        return jsonify({"error": error}), 400
     print(f"Received file: {file.filename}")
     
-    if file.filename == "":
-        print("No file selected")
-        return jsonify({"error": "No file selected"}), 400
-
-    # Extract text (using existing functions)
-    filename = file.filename.lower()
-    text = ""
+    try:
+        options = analysis_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
-        if filename.endswith(".pdf"):
-            print("Processing PDF file")
-            text = extract_pdf(file.stream)
-        elif filename.endswith(".docx"):
-            print("Processing DOCX file")
-            text = extract_docx(file.stream)
-        elif filename.endswith((".png", ".jpg", ".jpeg")):
-            print("Processing image file")
-            text = extract_image(file.stream)
-        else:
-            print(f"Unsupported file type: {filename}")
-            return jsonify({"error": "Unsupported file type"}), 400
-        
-        print(f"Extracted text length: {len(text)}")
-        
-        # Check if it's a valid agreement (using existing function)
-        is_ok, details = classify_agreement(text)
-        print(f"Classification result: {is_ok}, Details: {details}")
-        
-        if not is_ok:
-            print("Warning: Low confidence classification, proceeding anyway")
-        
-        # Perform enhanced analysis
-        print("Performing enhanced analysis")
-        analysis = analyze_legal_document(text)
-        print(f"Analysis completed: {analysis.get('summary', 'No summary')[:100]}...")
-        
-        return jsonify({
-            "filename": file.filename,
-            "extracted_text": text,
-            "analysis": analysis,
-            "timestamp": datetime.now().isoformat()
-        })
+        payload, status = analyze_upload(file, options)
+        return jsonify(payload), status
     except Exception as e:
         print(f"Error in enhanced_document_analysis: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+# Batch analysis: many files per request, processed concurrently, with one
+# NDJSON line per file streamed back as soon as that file is done
+@app.route("/enhanced_analysis/batch", methods=["POST"])
+def enhanced_document_analysis_batch():
+    files = request.files.getlist("files") or request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {BATCH_MAX_FILES} files per batch"}), 400
+    try:
+        options = analysis_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"Received batch of {len(files)} files")
+    # The uploads are read while the response streams
+    files = [upload_spool.detach(f) for f in files]
+
+    def run(index, file):
+        error = upload_error(file)
+        if error:
+            return {"index": index, "filename": file.filename, "status": 400, "error": error}
+        try:
+            # Each file's deadline starts when a batch thread picks it up
+            payload, status = analyze_upload(file, dict(options, deadline=analysis_deadline()))
+        except Exception as e:
+            print(f"Error analyzing {file.filename}: {e}")
+            payload, status = {"filename": file.filename,
+                               "error": f"Internal server error: {str(e)}"}, 500
+        return {"index": index, "status": status, **payload}
+
+    def generate():
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(files))) as pool:
+                futures = [pool.submit(run, i, f) for i, f in enumerate(files)]
+                for future in as_completed(futures):
+                    yield json.dumps(future.result()) + "\n"
+        finally:
+            for f in files:
+                f.close()
+        yield json.dumps({
+            "done": True,
+            "files": len(files),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming analysis: Server-Sent Events with the extraction and
+# classification first, then each analysis field as the model completes it
+@app.route("/enhanced_analysis/stream", methods=["POST"])
+def enhanced_document_analysis_stream():
+    file = request.files.get("file")
+    error = upload_error(file)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        options = analysis_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"Received file for streaming analysis: {file.filename}")
+    # The upload is read while the response streams
+    file = upload_spool.detach(file)
+
+    def generate():
+        try:
+            kind = file_kind(file.filename)
+            char_budget = None if options["full_extraction"] else EXTRACTION_BUDGETS["analysis"]
+            text, extraction = extract_upload(file.stream, kind, char_budget, options["text_engine"])
+            extraction["full_extraction"] = options["full_extraction"]
+            yield sse("extraction", {
+                "filename": file.filename,
+                "extracted_text": text,
+                "extraction": extraction
+            })
+
+            result = classify_document(text)
+            yield sse("classification", result)
+            if not result["is_agreement"] and options["strict"]:
+                yield sse("error", {"error": "Document was not recognised as an agreement", "status": 422})
+                return
+
+            report = {}
+            analysis = None
+            for event, data in stream_analysis_events(text, result["document_type"], report,
+                                                      options["deadline"]):
+                if event == "analysis":
+                    analysis = data
+                else:
+                    yield sse(event, data)
+            yield sse("done", {
+                "analysis": analysis,
+                "analysis_report": report,
+                "timestamp": datetime.now().isoformat()
+            })
+        except Exception as e:
+            print(f"Error in enhanced_document_analysis_stream: {e}")
+            yield sse("error", {"error": f"Internal server error: {str(e)}", "status": 500})
+        finally:
+            file.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # File extraction functions
-def extract_pdf(file_stream):
+def extract_pdf(file_stream, char_budget=None, report=None, engine=None):
+    """
+    Extract PDF text page by page, OCRing only pages without a text layer.
+    With char_budget, stop reading pages once that much text is collected.
+    `engine` picks the text-layer engine ("auto", "fitz" or "pdfplumber").
+    Page counts, skipped pages and the engine used are written to `report`
+    if given.
+    """
     try:
-        file_stream.seek(0)
-        with pdfplumber.open(file_stream) as pdf:
-            return safe_join_text([p.extract_text() for p in pdf.pages])
+        # Spooled uploads are handed to the page workers by path
+        source = upload_spool.source_of(file_stream)
+        engine = pdf_engine.choose_engine(source, engine)
+        texts, sources = pdf_engine.extract_pages(source, char_budget=char_budget, engine=engine)
+        print(f"PDF pages: {sources.count('text')} text, {sources.count('ocr')} ocr, "
+              f"{sources.count('empty')} empty, {sources.count('skipped')} skipped")
+        if report is not None:
+            report.update({
+                "text_engine": engine,
+                "pages": len(sources),
+                "ocr_pages": sources.count("ocr"),
+                "skipped_pages": [i + 1 for i, src in enumerate(sources) if src == "skipped"]
+            })
+        # Pages stay apart for the repeated-line index in text_normalize
+        return text_normalize.PAGE_BREAK.join(t for t in texts if t)
     except Exception as e:
         print(f"PDF extract error: {e}")
-        try:
-            file_stream.seek(0)
-            doc = fitz.open(stream=file_stream.read(), filetype="pdf")
-            texts = []
-            for p in doc:
-                pix = p.get_pixmap(dpi=200)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                texts.append(pytesseract.image_to_string(img))
-            return "\n".join(texts)
-        except Exception as e2:
-            print(f"PDF OCR error: {e2}")
-            return ""
-
-def extract_docx(file_stream):
+        return ""
+
+def extract_docx(file_stream, char_budget=None, report=None):
+    """
+    Stream paragraph and table text out of word/document.xml, stopping once
+    char_budget characters are collected. Falls back to python-docx if the
+    package cannot be streamed.
+    """
+    try:
+        parts, collected, truncated = [], 0, False
+        # zipfile needs a seekable file object, which an mmap is not; spooled
+        # uploads are read in place through their file instead
+        file_stream.seek(0)
+        for block in docx_stream.iter_docx_text(file_stream):
+            parts.append(block)
+            collected += len(block) + 1
+            if char_budget is not None and collected >= char_budget:
+                truncated = True
+                break
+        if report is not None:
+            report["truncated"] = truncated
+        return "\n".join(parts)
+    except Exception as e:
+        print(f"DOCX stream error, falling back to python-docx: {e}")
     try:
         file_stream.seek(0)
-        doc = docx.Document(io.BytesIO(file_stream.read()))
+        doc = docx.Document(file_stream)
         return "\n".join(p.text for p in doc.paragraphs if p.text)
     except Exception as e:
         print(f"DOCX extract error: {e}")
         return ""
 
-def extract_image(file_stream):
+def extract_image(file_stream, char_budget=None, report=None):
+    """
+    OCR every frame of an image (multi-page TIFFs included), tiling very
+    large scans. Stops after char_budget characters if given.
+    """
     try:
-        file_stream.seek(0)
-        img = Image.open(file_stream).convert("RGB")
-        return pytesseract.image_to_string(img)
+        with upload_spool.mapped(file_stream) as view:
+            return image_engine.extract_image_text(view, char_budget=char_budget, report=report)
     except Exception as e:
         print(f"Image extract error: {e}")
         return ""
 
+def file_kind(filename):
+    """
+    Map an upload's filename to its extractor kind, or None if unsupported
+    """
+    name = (filename or "").lower()
+    for kind, extensions in FILE_KINDS.items():
+        if name.endswith(extensions):
+            return kind
+    return None
+
+def extraction_covers(entry, char_budget):
+    """
+    Whether a cached extraction has all the text an extraction with
+    char_budget would: it read the whole document, or had a budget at
+    least as large
+    """
+    if entry is None:
+        return False
+    report = entry["report"]
+    complete = not (report.get("skipped_pages") or report.get("skipped_frames") or report.get("truncated"))
+    budget = report.get("char_budget")
+    return complete or budget is None or (char_budget is not None and budget >= char_budget)
+
+def extract_upload(file_stream, kind, char_budget=None, text_engine=None):
+    """
+    Extract text from an uploaded file, reusing the cached result when the
+    same bytes have been extracted before by any worker.
+
+    Returns (text, report). char_budget lets the extractors stop early once
+    enough text for the analysis has been collected; a cached extraction
+    made with a larger budget (or of the whole document) is reused as is,
+    so /classify followed by /enhanced_analysis reads a short upload once.
+    text_engine selects the PDF text-layer engine.
+    """
+    key = upload_spool.digest(file_stream, kind, EXTRACTOR_VERSION, text_engine, TEXT_NORMALIZE)
+    def covers(entry):
+        return extraction_covers(entry, char_budget)
+
+    cached = extract_cache.get(key, covers)
+    if cached is not None:
+        print(f"Extraction cache hit: {key[:12]}")
+        return cached["text"], cached["report"]
+
+    def extract():
+        report = {"char_budget": char_budget}
+        if kind == "pdf":
+            text = extract_pdf(file_stream, char_budget=char_budget, report=report, engine=text_engine)
+        else:
+            text = EXTRACTORS[kind](file_stream, char_budget=char_budget, report=report)
+        text = normalize_text(text, report)
+        # Empty text usually means a failed extraction; retry it next time.
+        # The entry is replaced only by one covering more of the document.
+        if text and not extraction_covers(extract_cache.peek(key), char_budget):
+            extract_cache.set(key, {"text": text, "report": report})
+        return {"text": text, "report": report}
+
+    # Concurrent uploads of the same bytes wait on one extraction
+    result = flights.do("extract-" + key, extract, lambda: extract_cache.peek(key, covers))
+    if not covers(result):
+        # Led by a concurrent extraction with a smaller budget
+        result = extract()
+    return result["text"], result["report"]
+
+def normalize_text(text, report):
+    """
+    Normalization stage between extraction and classification; what it
+    saved is written to report["normalization"]
+    """
+    if not TEXT_NORMALIZE:
+        return text.replace(text_normalize.PAGE_BREAK, "\n")
+    normalization = {}
+    text = text_normalize.normalize(text, normalization)
+    report["normalization"] = normalization
+    print(f"Normalized text: {normalization['bytes_saved']} bytes, "
+          f"~{normalization['tokens_saved']} tokens saved")
+    return text
+
+def form_flag(name):
+    return request.form.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+FILE_KINDS = {
+    "pdf": (".pdf",),
+    "docx": (".docx",),
+    "image": (".png", ".jpg", ".jpeg", ".tif", ".tiff"),
+}
+
+EXTRACTORS = {
+    "pdf": extract_pdf,
+    "docx": extract_docx,
+    "image": extract_image,
+}
+
 # Routes
 @app.route("/active", methods=["GET"])
 def active():
     return "active"
 
+# Health with the model circuit state: 503 while the breaker is open, so a
+# load balancer or monitor sees that analyses are degraded to the local path
+@app.route("/health", methods=["GET"])
+def health():
+    breaker = model_client.breaker.snapshot() if model_client and model_client.breaker else None
+    if AI_MODE == "NONE" or model_client is None:
+        status = "fallback"
+    elif breaker["state"] == "closed":
+        status = "ok"
+    else:
+        status = "degraded"
+    return jsonify({
+        "status": status,
+        "pid": os.getpid(),
+        "ai_mode": AI_MODE,
+        "breaker": breaker,
+        "model_in_flight": model_client.stats["in_flight"] if model_client else 0
+    }), 503 if breaker and breaker["state"] == "open" else 200
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "pid": os.getpid(),
+        "extract_cache": extract_cache.snapshot(),
+        "analysis_cache": analysis_cache.snapshot(),
+        "single_flight": flights.snapshot(),
+        "model_client": model_client.snapshot() if model_client else None
+    })
+
 @app.route("/export/pdf", methods=["POST"])
 def export_pdf():
     text = request.form.get("text", "")
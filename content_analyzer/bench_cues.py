@@ -0,0 +1,91 @@
+"""
+Micro-benchmark the section-cue matcher.
+
+Compares the old per-cue loop (lowercase the text, one re.search per cue)
+with the single-pass CueMatcher on generated texts, checking both return
+the same score. A second table compares classify_agreement's old chunk
+scoring (rebuild each 300-word chunk and rescan it) with the single-scan
+NumPy binning in CueMatcher.chunk_scores.
+
+Usage:
+    python bench_cues.py [--mb 1] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import time
+
+from app import SECTION_CUES, CUE_MATCHER
+
+FILLER = ("the said party hereby undertakes to comply with all terms herein "
+          "stated including any schedule annexed thereto and the rent payable").split()
+
+
+def old_heuristic_score(text):
+    t = (text or "").lower()
+    found = sum(1 for k in SECTION_CUES if re.search(r"\b" + re.escape(k) + r"\b", t))
+    return found / max(1, len(SECTION_CUES))
+
+
+def old_chunk_scores(text, max_chunks=None):
+    words = text.split()
+    chunks = [" ".join(words[i:i + 300]) for i in range(0, len(words), 300)][:max_chunks]
+    return [old_heuristic_score(ch) for ch in chunks], old_heuristic_score(text)
+
+
+def make_text(size, cue_rate, rng):
+    words, length = [], 0
+    while length < size:
+        if rng.random() < cue_rate:
+            w = rng.choice(SECTION_CUES)
+            w = w.upper() if rng.random() < 0.2 else w
+        else:
+            w = rng.choice(FILLER)
+        words.append(w)
+        length += len(w) + 1
+    return " ".join(words)
+
+
+def best_of(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    size = int(args.mb * 1024 * 1024)
+
+    print(f"{'text':>22} {'per-cue ms':>11} {'single-pass ms':>15} {'speedup':>8}")
+    cases = [
+        ("no cues", 0.0),
+        ("sparse cues (0.1%)", 0.001),
+        ("dense cues (5%)", 0.05),
+    ]
+    for label, rate in cases:
+        text = make_text(size, rate, rng)
+        old_s, old = best_of(old_heuristic_score, text, args.repeat)
+        new_s, new = best_of(CUE_MATCHER.score, text, args.repeat)
+        assert old == new, (label, old, new)
+        print(f"{label:>22} {old_s * 1000:>11.1f} {new_s * 1000:>15.1f} {old_s / new_s:>7.1f}x")
+
+    print()
+    print(f"{'chunk scoring':>22} {'old 10 chunks ms':>17} {'old all ms':>11} {'single-scan ms':>15}")
+    for label, rate in cases:
+        text = make_text(size, rate, rng)
+        capped_s, _ = best_of(lambda t: old_chunk_scores(t, 10), text, args.repeat)
+        all_s, (old_chunks, _) = best_of(old_chunk_scores, text, args.repeat)
+        new_s, (new_chunks, _) = best_of(lambda t: CUE_MATCHER.chunk_scores(t, 300), text, args.repeat)
+        assert list(new_chunks) == old_chunks, label
+        print(f"{label:>22} {capped_s * 1000:>17.1f} {all_s * 1000:>11.1f} {new_s * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
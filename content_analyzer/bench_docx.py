@@ -0,0 +1,75 @@
+"""
+Benchmark DOCX extraction: python-docx object tree vs streaming iterparse.
+
+Builds agreements of increasing size with python-docx (paragraphs plus a
+payment-schedule table per section) and reports time, peak Python memory
+and extracted characters for both paths.
+
+Usage:
+    python bench_docx.py [--sections 100 1000 5000]
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import docx
+
+import docx_stream
+
+CLAUSE = (
+    "The Licensee shall pay the fees set out in the schedule below within "
+    "thirty days of the invoice date, failing which interest shall accrue."
+)
+
+
+def build_docx(sections):
+    d = docx.Document()
+    for n in range(sections):
+        d.add_heading(f"Section {n + 1}", level=2)
+        for _ in range(5):
+            d.add_paragraph(CLAUSE)
+        table = d.add_table(rows=4, cols=3)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"Instalment {r + 1}" if c == 0 else f"{(r + 1) * (c + 1) * 1000}"
+    buf = io.BytesIO()
+    d.save(buf)
+    return buf.getvalue()
+
+
+def python_docx_path(data):
+    doc = docx.Document(io.BytesIO(data))
+    return "\n".join(p.text for p in doc.paragraphs if p.text)
+
+
+def streaming_path(data):
+    return "\n".join(docx_stream.iter_docx_text(io.BytesIO(data)))
+
+
+def measure(fn, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    text = fn(data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'sections':>9} {'size KB':>8} {'path':>12} {'seconds':>8} {'peak MB':>8} {'chars':>9}")
+    for sections in args.sections:
+        data = build_docx(sections)
+        for name, fn in (("python-docx", python_docx_path), ("streaming", streaming_path)):
+            elapsed, peak, chars = measure(fn, data)
+            print(f"{sections:>9} {len(data) // 1024:>8} {name:>12} {elapsed:>8.2f} "
+                  f"{peak / 1e6:>8.1f} {chars:>9}")
+
+
+if __name__ == "__main__":
+    main()
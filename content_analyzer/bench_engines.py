@@ -0,0 +1,64 @@
+"""
+Benchmark PDF text engines on a fixed corpus.
+
+For every PDF, runs the fitz and pdfplumber text-layer engines in-process
+(one worker, no OCR) and reports characters per second, what the auto probe
+would choose, and how closely the two outputs agree (word-sequence
+similarity after whitespace normalisation).
+
+Usage:
+    python bench_engines.py [file.pdf ...]
+
+Without arguments the corpus is the sample PDFs in the repository root plus
+a synthetic 40-page agreement.
+"""
+import argparse
+import difflib
+import glob
+import os
+import time
+
+import pdf_engine
+from bench_extract import build_pdf
+
+
+def default_corpus():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    corpus = [(os.path.basename(p), p) for p in sorted(glob.glob(os.path.join(root, "*.pdf")))]
+    corpus.append(("synthetic-40p", build_pdf(40)))
+    return corpus
+
+
+def run_engine(engine, source, page_count):
+    start = time.perf_counter()
+    texts = pdf_engine.extract_text_pages(source, page_count, workers=1, engine=engine)
+    elapsed = time.perf_counter() - start
+    return "\n".join(t or "" for t in texts), elapsed
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a.split(), b.split(), autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdfs", nargs="*")
+    args = parser.parse_args()
+    corpus = [(os.path.basename(p), p) for p in args.pdfs] or default_corpus()
+
+    print(f"{'document':>28} {'pages':>6} {'probe':>11} {'fitz chars/s':>13} "
+          f"{'plumber chars/s':>16} {'speedup':>8} {'equiv':>6}")
+    for name, source in corpus:
+        page_count = pdf_engine.count_pages(source)
+        probe = pdf_engine.choose_engine(source, "auto")
+        fitz_text, fitz_s = run_engine("fitz", source, page_count)
+        plumber_text, plumber_s = run_engine("pdfplumber", source, page_count)
+        print(f"{name[:28]:>28} {page_count:>6} {probe:>11} "
+              f"{len(fitz_text) / max(fitz_s, 1e-9):>13.0f} "
+              f"{len(plumber_text) / max(plumber_s, 1e-9):>16.0f} "
+              f"{plumber_s / max(fitz_s, 1e-9):>7.1f}x "
+              f"{similarity(fitz_text, plumber_text):>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark page-parallel PDF extraction.
+
+Builds a synthetic multi-page agreement with reportlab and measures pages per
+second for the text-layer and OCR paths at increasing worker counts.
+
+Usage:
+    python bench_extract.py [--pages 40] [--ocr] [--pdf path/to/file.pdf]
+"""
+import argparse
+import io
+import os
+import time
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import pdf_engine
+
+CLAUSE = (
+    "The Tenant shall pay the monthly rent on or before the fifth day of each "
+    "calendar month. The security deposit shall be refunded within thirty days "
+    "of termination subject to deductions for damage beyond normal wear."
+)
+
+
+def build_pdf(pages):
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for n in range(pages):
+        y = 800
+        c.drawString(72, y, f"RENTAL AGREEMENT - Page {n + 1}")
+        for line in range(45):
+            y -= 16
+            c.drawString(72, y, f"{line + 1}. {CLAUSE[:90]}")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def bench(fn, data, page_count, workers):
+    start = time.perf_counter()
+    texts = fn(data, page_count, workers=workers)
+    elapsed = time.perf_counter() - start
+    chars = sum(len(t or "") for t in texts)
+    return elapsed, chars
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--ocr", action="store_true", help="benchmark the OCR path")
+    parser.add_argument("--pdf", help="use an existing PDF instead of a synthetic one")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            data = f.read()
+    else:
+        data = build_pdf(args.pages)
+    page_count = pdf_engine.count_pages(data)
+    fn = pdf_engine.ocr_pages if args.ocr else pdf_engine.extract_text_pages
+    label = "ocr" if args.ocr else "text"
+
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+    print(f"{label} path, {page_count} pages, {cpus} cpus")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8} {'chars':>9}")
+
+    # Warm the pools so process start-up is not counted
+    for w in worker_counts:
+        if w > 1:
+            fn(data, page_count, workers=w)
+
+    baseline = None
+    for w in worker_counts:
+        elapsed, chars = bench(fn, data, page_count, w)
+        baseline = baseline or elapsed
+        print(f"{w:>8} {elapsed:>9.2f} {page_count / elapsed:>9.1f} "
+              f"{baseline / elapsed:>7.2f}x {chars:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Report peak memory of one extraction request, in-memory vs spooled upload.
+
+Each measurement runs in a fresh child process so the high-water marks are
+not shared. "bytes" reproduces the old request path (the whole upload read
+into memory and pickled to the page workers); "spooled" hands extractors the
+file on disk, as the service now does for uploads above
+UPLOAD_SPOOL_THRESHOLD.
+
+Usage:
+    python bench_memory.py path/to/document.pdf [--kind pdf]
+"""
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+
+
+def worker_peak_kb(pools):
+    """
+    Largest peak RSS among the live pool workers, from /proc (Linux).
+    getrusage(RUSAGE_CHILDREN) only counts children that have exited and
+    been reaped, and pool workers are children of the forkserver anyway.
+    """
+    peak = 0
+    for pool in pools:
+        for pid in list(pool._processes or {}):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            peak = max(peak, int(line.split()[1]))
+            except OSError:
+                pass
+    return peak
+
+
+def run_child(path, kind, mode):
+    import app
+
+    if mode == "bytes":
+        with open(path, "rb") as f:
+            stream = io.BytesIO(f.read())
+    else:
+        stream = open(path, "rb")
+    app.extract_cache.memory = None
+    app.extract_cache.disk = None
+    text, _ = app.extract_upload(stream, kind)
+    me = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Both in KB on Linux; sampled while the pools are still up
+    pools = list(app.pdf_engine._pools.values())
+    # None when extraction ran inline (few pages, one worker, not a PDF)
+    workers = worker_peak_kb(pools) / 1024 if pools else None
+    print(json.dumps({"chars": len(text), "self_mb": me / 1024, "workers_mb": workers}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--kind", default="pdf", choices=["pdf", "docx", "image"])
+    parser.add_argument("--mode", choices=["bytes", "spooled"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args.path, args.kind, args.mode)
+        return
+
+    print(f"{'mode':>8} {'request MB':>11} {'max worker MB':>14} {'chars':>9}")
+    for mode in ("bytes", "spooled"):
+        out = subprocess.run(
+            [sys.executable, __file__, args.path, "--kind", args.kind, "--mode", mode],
+            capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        workers = "-" if r["workers_mb"] is None else f"{r['workers_mb']:.1f}"
+        print(f"{mode:>8} {r['self_mb']:>11.1f} {workers:>14} {r['chars']:>9}")
+
+
+if __name__ == "__main__":
+    main()
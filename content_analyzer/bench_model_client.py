@@ -0,0 +1,89 @@
+"""
+Model-call throughput against the local stub server, fully offline.
+
+"sync x4" reproduces the old path: four gunicorn sync workers, each making
+one blocking round trip at a time with no client in between. "async" is the
+threaded deployment: every request thread sends its call through one
+AsyncModelClient with its concurrency cap and token buckets. With
+--rpm the stub enforces a quota, so the async run shows how 429s are absorbed
+by jittered backoff instead of failing requests.
+
+Usage:
+    python bench_model_client.py [--calls 40] [--latency 1.0] [--concurrency 16] [--rpm 0]
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import model_client
+import stub_model_server
+
+PROMPT = "Analyze the following rental agreement. " * 2000
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def blocking_call(url):
+    """
+    One direct request to the stub, as a sync worker made it before the client
+    """
+    def call(prompt):
+        with model_client._post(url, {"prompt": prompt, "config": {}}, 120) as resp:
+            return json.loads(resp.read().decode("utf-8"))["text"]
+    return call
+
+
+def run(label, call, calls, threads, client=None):
+    latencies, failures = [], 0
+
+    def one(_):
+        start = time.perf_counter()
+        call(PROMPT)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(one, i) for i in range(calls)]
+        for f in futures:
+            try:
+                latencies.append(f.result())
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    retries = client.snapshot()["retries"] if client else "-"
+    print(f"{label:>10} {elapsed:>8.1f} {calls / elapsed:>8.2f} {percentile(latencies, 0.5):>8.2f} "
+          f"{percentile(latencies, 0.95):>8.2f} {retries:>8} {failures:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rpm", type=int, default=0, help="stub server quota (0 = none)")
+    parser.add_argument("--client-rpm", type=int, default=600)
+    parser.add_argument("--client-tpm", type=int, default=4_000_000)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'total s':>8} {'calls/s':>8} {'p50 s':>8} {'p95 s':>8} {'retries':>8} {'failed':>8}")
+    # Four sync workers: four blocking calls at a time, 429s fail the request
+    server = stub_model_server.start_in_thread(latency=args.latency, rpm=args.rpm)
+    run("sync x4", blocking_call(server.url), args.calls, threads=4)
+    server.shutdown()
+
+    server = stub_model_server.start_in_thread(latency=args.latency, rpm=args.rpm)
+    client = model_client.AsyncModelClient(
+        model_client.http_call(server.url), concurrency=args.concurrency,
+        requests_per_minute=args.client_rpm, tokens_per_minute=args.client_tpm,
+        base_delay=0.5, max_delay=10.0)
+    # Threaded workers: every request has a thread waiting on the client
+    run("async", client.generate_sync, args.calls, threads=args.calls, client=client)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark OCR backends.
+
+Rasterizes a synthetic agreement (or an existing PDF) and compares per-page
+latency and throughput of the pytesseract subprocess path against the pooled
+in-process tesserocr engines.
+
+With --preprocess it instead compares the old fixed 200 dpi RGB rendering
+against the adaptive grayscale pipeline: pixels, OCR time and similarity of
+the OCR output to the page's text layer.
+
+Usage:
+    python bench_ocr.py [--pages 10] [--threads 2] [--pdf path/to/file.pdf]
+    python bench_ocr.py --preprocess [--pdf path/to/file.pdf]
+"""
+import argparse
+import difflib
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+from PIL import Image
+
+import ocr_backend
+import ocr_preprocess
+from bench_extract import build_pdf
+
+
+def render_fixed(page, dpi=200):
+    pix = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def render_pages(data, dpi=200):
+    images = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi)
+            images.append(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+    return images
+
+
+def timed_ocr(backend, img):
+    start = time.perf_counter()
+    backend.image_to_string(img)
+    return time.perf_counter() - start
+
+
+def bench(backend, images, threads):
+    # Warm-up so engine creation is not counted as page latency
+    backend.image_to_string(images[0])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        latencies = list(ex.map(lambda img: timed_ocr(backend, img), images))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "pages_per_s": len(images) / wall,
+    }
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, " ".join(a.split()), " ".join(b.split())).ratio()
+
+
+def bench_preprocess(data):
+    modes = {
+        "fixed-200-rgb": render_fixed,
+        "adaptive": ocr_preprocess.render_page,
+    }
+    print(f"{'mode':>14} {'Mpixels':>9} {'seconds':>9} {'similarity':>11}")
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        truth = [page.get_text() for page in doc]
+        for name, render in modes.items():
+            pixels, elapsed, scores = 0, 0.0, []
+            for i, page in enumerate(doc):
+                img = render(page)
+                pixels += img.width * img.height
+                start = time.perf_counter()
+                text = ocr_backend.image_to_string(img)
+                elapsed += time.perf_counter() - start
+                scores.append(similarity(text, truth[i]))
+            print(f"{name:>14} {pixels / 1e6:>9.1f} {elapsed:>9.2f} "
+                  f"{statistics.mean(scores):>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=ocr_backend.OCR_ENGINE_POOL)
+    parser.add_argument("--pdf", help="use an existing PDF instead of a synthetic one")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="compare fixed-DPI rendering with the adaptive pipeline")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            data = f.read()
+    else:
+        data = build_pdf(args.pages)
+    if args.preprocess:
+        bench_preprocess(data)
+        return
+    images = render_pages(data)
+
+    backends = [ocr_backend.PytesseractBackend()]
+    if ocr_backend.tesserocr is not None:
+        backends.append(ocr_backend.TesserocrBackend(size=args.threads))
+    else:
+        print("tesserocr not installed - only benchmarking pytesseract")
+
+    print(f"{len(images)} pages, {args.threads} threads")
+    print(f"{'backend':>12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'pages/s':>9}")
+    for backend in backends:
+        r = bench(backend, images, args.threads)
+        print(f"{backend.name:>12} {r['mean_ms']:>9.0f} {r['p50_ms']:>9.0f} "
+              f"{r['p95_ms']:>9.0f} {r['pages_per_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Small tiered cache used by the content analyzer.
+
+MemoryLRU is a bounded per-process tier. DiskStore keeps zlib-compressed JSON
+files in a directory shared by every gunicorn worker on the host. TieredCache
+checks memory first, then disk, and counts hits and misses. With a ttl it
+also stamps entries on write and treats older entries as misses in both tiers.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def content_key(data, *parts):
+    """
+    SHA-256 of the given bytes plus any version/namespace parts
+    """
+    h = hashlib.sha256(data)
+    for part in parts:
+        h.update(b"\0" + str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+class MemoryLRU:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskStore:
+    """
+    One compressed file per key. Writes go through a temp file and
+    os.replace so concurrent workers never read a partial entry.
+    """
+
+    PRUNE_EVERY = 32
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json.z")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            # Touch so pruning evicts least recently used entries first
+            os.utime(path, None)
+            return json.loads(zlib.decompress(raw).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Cache read error for {key[:12]}: {e}")
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            raw = zlib.compress(json.dumps(value).encode("utf-8"), 6)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Cache write error for {key[:12]}: {e}")
+            return
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Delete the least recently used files until the store fits max_bytes
+        """
+        entries, total = [], 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+class TieredCache:
+    def __init__(self, memory=None, disk=None, ttl=None):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _fresh(self, entry, counted=True):
+        """
+        Unwrap a stamped entry, or None if it is older than ttl
+        """
+        if not self.ttl:
+            return entry
+        if time.time() - entry.get("stored_at", 0) > self.ttl:
+            if counted:
+                self._count("expired")
+            return None
+        return entry.get("value")
+
+    def _lookup(self, key, counted, accept=None):
+        if self.memory is not None:
+            entry = self.memory.get(key)
+            value = self._fresh(entry, counted) if entry is not None else None
+            if value is not None and (accept is None or accept(value)):
+                if counted:
+                    self._count("memory_hits")
+                return value
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            value = self._fresh(entry, counted) if entry is not None else None
+            if value is not None and (accept is None or accept(value)):
+                if counted:
+                    self._count("disk_hits")
+                if self.memory is not None:
+                    self.memory.set(key, entry)
+                return value
+        if counted:
+            self._count("misses")
+        return None
+
+    def get(self, key, accept=None):
+        """
+        Cached value, or None; with accept, a value it rejects (e.g. too
+        partial for the caller) counts as a miss
+        """
+        return self._lookup(key, True, accept)
+
+    def peek(self, key, accept=None):
+        """
+        get() without touching the counters, for re-checking a key the
+        caller has already counted a miss for
+        """
+        return self._lookup(key, False, accept)
+
+    def set(self, key, value):
+        self._count("stores")
+        if self.ttl:
+            value = {"stored_at": time.time(), "value": value}
+        if self.memory is not None:
+            self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_ratio"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory) if self.memory is not None else 0
+        return stats
+
+
+def build_cache(backend, max_entries, directory, max_bytes, ttl=None):
+    """
+    TieredCache for a backend name: "tiered" (memory then disk), "memory",
+    "disk" or "none"
+    """
+    if backend not in ("tiered", "memory", "disk", "none"):
+        raise ValueError(f"Unknown cache backend: {backend}")
+    use_memory = backend in ("tiered", "memory")
+    use_disk = backend in ("tiered", "disk") and directory
+    return TieredCache(
+        memory=MemoryLRU(max_entries) if use_memory else None,
+        disk=DiskStore(directory, max_bytes) if use_disk else None,
+        ttl=ttl
+    )
@@ -0,0 +1,151 @@
+"""
+Single-pass multi-keyword matching for the agreement heuristics.
+
+All cues are compiled into one case-insensitive, prefix-factored (trie)
+alternation wrapped in a zero-width lookahead, so a single scan tries every
+word boundary once, rejects most positions on their first character, and
+reports the longest cue starting there, without lowercasing a copy of the
+text. Cues that can only occur inside a longer cue ("agreement" within
+"rental agreement") are credited from that longer match, which keeps the
+result identical to testing each cue separately with \\bcue\\b.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+
+
+def trie_pattern(words):
+    """
+    Regex source matching any of `words`, factored on shared prefixes and
+    preferring the longest word at each position
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node):
+    end = "" in node
+    branches = [re.escape(ch) + _node_pattern(child)
+                for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if end:
+        # Greedy optional: try the longer word first, fall back to the
+        # word ending here
+        return "(?:" + body + ")?"
+    return body
+
+
+class CueMatcher:
+    """
+    With prefix=True a cue only has to start at a word boundary, so "rent"
+    matches "rent", "rental" and "rents" but not "current".
+    """
+
+    def __init__(self, cues, prefix=False):
+        end = "" if prefix else r"\b"
+        self.cues = list(dict.fromkeys(c.lower() for c in cues))
+        self.cue_ids = {c: i for i, c in enumerate(self.cues)}
+        # The first-character class lets the engine reject most word
+        # boundaries before entering the trie
+        first = "".join(sorted({re.escape(c[0]) for c in self.cues}))
+        self.pattern = re.compile(
+            r"\b(?=[" + first + r"])(?=(" + trie_pattern(self.cues) + r")" + end + ")", re.IGNORECASE)
+        # For each cue, the other cues that match inside it, with offsets
+        self.implied = {}
+        for cue in self.cues:
+            inner = []
+            for other in self.cues:
+                if other == cue:
+                    continue
+                for m in re.finditer(r"\b(?=" + re.escape(other) + end + ")", cue):
+                    inner.append((m.start(), other))
+            self.implied[cue] = inner
+
+    def iter_hits(self, text):
+        """
+        Yield (position, cue) for every cue occurrence in text, in order of
+        position (implied inner cues follow the cue that contains them)
+        """
+        for m in self.pattern.finditer(text or ""):
+            cue = m.group(1).lower()
+            # IGNORECASE also folds a few non-ASCII letters (e.g. long s)
+            # that str.lower() leaves alone; the per-cue search on lowered
+            # text would not match those, so neither do we
+            if cue not in self.implied:
+                continue
+            start = m.start()
+            yield start, cue
+            for offset, inner in self.implied[cue]:
+                yield start + offset, inner
+
+    def found(self, text):
+        """
+        Set of distinct cues present in text
+        """
+        seen = set()
+        total = len(self.cues)
+        for _, cue in self.iter_hits(text):
+            seen.add(cue)
+            if len(seen) == total:
+                break
+        return seen
+
+    def counts(self, text):
+        """
+        Occurrences of each cue in text
+        """
+        return Counter(cue for _, cue in self.iter_hits(text))
+
+    def score(self, text):
+        """
+        Fraction of cues present in text
+        """
+        return len(self.found(text)) / max(1, len(self.cues))
+
+    def chunk_scores(self, text, max_words=300):
+        """
+        Score every max_words-word chunk of text from one scan.
+
+        The text is split into words once and scanned as a single
+        whitespace-normalised string; each cue hit is mapped to its chunk by
+        binary search over word start offsets, and distinct cues per chunk
+        are counted with NumPy. Hits straddling a chunk boundary count for
+        the whole text but for neither chunk, as when each chunk was
+        rebuilt and scanned on its own.
+
+        Returns (per_chunk_scores array, whole_text_score).
+        """
+        words = (text or "").split()
+        n_cues = max(1, len(self.cues))
+        if not words:
+            return np.zeros(0), 0.0
+        n_chunks = -(-len(words) // max_words)
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+        starts = np.empty(len(words), dtype=np.int64)
+        starts[0] = 0
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+
+        positions, ends, cue_ids = [], [], []
+        for pos, cue in self.iter_hits(" ".join(words)):
+            positions.append(pos)
+            ends.append(pos + len(cue) - 1)
+            cue_ids.append(self.cue_ids[cue])
+        if not positions:
+            return np.zeros(n_chunks), 0.0
+        cue_ids = np.array(cue_ids, dtype=np.int64)
+        overall = len(np.unique(cue_ids)) / n_cues
+
+        first_chunk = (np.searchsorted(starts, positions, side="right") - 1) // max_words
+        last_chunk = (np.searchsorted(starts, ends, side="right") - 1) // max_words
+        inside = first_chunk == last_chunk
+        pairs = np.unique(first_chunk[inside] * n_cues + cue_ids[inside])
+        per_chunk = np.bincount(pairs // n_cues, minlength=n_chunks) / n_cues
+        return per_chunk, overall
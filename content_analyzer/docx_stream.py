@@ -0,0 +1,80 @@
+"""
+Streaming DOCX text extraction.
+
+Reads word/document.xml straight from the zip with iterparse and yields
+paragraph text and table rows in document order, clearing each element once
+it has been read so memory stays flat as documents grow. Unlike
+python-docx's doc.paragraphs, table cells are included; each row is yielded
+as its cell texts joined with " | ".
+"""
+import xml.etree.ElementTree as ET
+import zipfile
+
+DOCUMENT_PART = "word/document.xml"
+
+
+def _local(tag):
+    # Match on local names so both transitional and strict OOXML work
+    return tag.rsplit("}", 1)[-1]
+
+
+def _paragraph_text(p):
+    parts = []
+    for el in p.iter():
+        name = _local(el.tag)
+        if name == "t":
+            parts.append(el.text or "")
+        elif name == "tab":
+            parts.append("\t")
+        elif name in ("br", "cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def iter_docx_text(file_stream):
+    """
+    Yield non-empty paragraph texts and table rows from a .docx file object
+    """
+    with zipfile.ZipFile(file_stream) as zf:
+        with zf.open(DOCUMENT_PART) as xml:
+            body = None
+            rows, cells = [], []
+            for event, el in ET.iterparse(xml, events=("start", "end")):
+                name = _local(el.tag)
+                if event == "start":
+                    if name == "body":
+                        body = el
+                    elif name == "tr":
+                        rows.append([])
+                    elif name == "tc":
+                        cells.append([])
+                    continue
+
+                if name == "p":
+                    text = _paragraph_text(el)
+                    # Clearing also keeps text boxes nested in a paragraph
+                    # from being read twice by the enclosing paragraph
+                    el.clear()
+                    if cells:
+                        if text:
+                            cells[-1].append(text)
+                    elif text:
+                        yield text
+                elif name == "tc":
+                    cell = " ".join(cells.pop())
+                    if rows:
+                        rows[-1].append(cell)
+                elif name == "tr":
+                    row = " | ".join(c for c in rows.pop() if c)
+                    if cells:
+                        # Nested table: the row belongs to the outer cell
+                        if row:
+                            cells[-1].append(row)
+                    elif row:
+                        yield row
+                else:
+                    continue
+
+                # Drop finished top-level blocks so the tree never grows
+                if body is not None and not rows and not cells:
+                    body.clear()
@@ -0,0 +1,112 @@
+"""
+Image OCR engine: multi-frame files and tiled OCR of large scans.
+
+Every frame of the upload (multi-page TIFF faxes have many, PNG/JPEG have
+one) is preprocessed once. Frames whose prepared image is still larger than
+IMAGE_TILE_PIXELS are cut into horizontal bands at blank rows, so no text
+line is split between tiles. Tiles are OCRed on a thread pool (tesseract
+runs outside the GIL in both backends) and stitched back together in frame
+and top-to-bottom order.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageSequence
+
+import ocr_backend
+import ocr_preprocess
+
+IMAGE_OCR_WORKERS = int(os.environ.get("IMAGE_OCR_WORKERS", os.cpu_count() or 1))
+# Largest single tile sent to tesseract
+IMAGE_TILE_PIXELS = int(os.environ.get("IMAGE_TILE_PIXELS", 4_000_000))
+# Upper bound for a whole prepared frame before tiling; beyond this the
+# frame is downscaled as in ocr_preprocess
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 48_000_000))
+
+# Fraction of a band's height searched on either side of a cut for the
+# blankest row
+CUT_SEARCH = 0.15
+
+
+def split_bands(gray, max_pixels=IMAGE_TILE_PIXELS):
+    """
+    Cut a grayscale image into full-width horizontal bands of at most about
+    max_pixels, placing each cut on the brightest (emptiest) nearby row
+    """
+    if gray.width * gray.height <= max_pixels:
+        return [gray]
+    n_bands = -(-gray.width * gray.height // max_pixels)
+    band_h = gray.height / n_bands
+    profile = list(gray.resize((1, gray.height), Image.BOX).getdata())
+    window = max(1, int(band_h * CUT_SEARCH))
+
+    cuts = [0]
+    for k in range(1, n_bands):
+        target = int(k * band_h)
+        lo, hi = max(cuts[-1] + 1, target - window), min(gray.height - 1, target + window)
+        if lo >= hi:
+            continue
+        cuts.append(max(range(lo, hi), key=lambda y: profile[y]))
+    cuts.append(gray.height)
+    return [gray.crop((0, top, gray.width, bottom))
+            for top, bottom in zip(cuts, cuts[1:]) if bottom > top]
+
+
+def ocr_tiles(tiles):
+    return "\n".join(ocr_backend.image_to_string(ocr_preprocess.finish(t)) for t in tiles)
+
+
+def extract_image_text(file_stream, char_budget=None, report=None):
+    """
+    OCR every frame of an image file in reading order. With char_budget,
+    stop submitting frames once that much text has been collected.
+    Frame, tile and skipped-frame counts are written to `report` if given.
+    """
+    img = Image.open(file_stream)
+    n_frames = getattr(img, "n_frames", 1)
+    texts, tiles_total, collected = [], 0, 0
+    pending = []
+
+    def drain(limit):
+        nonlocal collected
+        # Resolve the oldest frames first so text stays in frame order
+        while len(pending) > limit:
+            text = pending.pop(0).result()
+            texts.append(text)
+            collected += len(text)
+
+    with ThreadPoolExecutor(max_workers=max(1, IMAGE_OCR_WORKERS)) as pool:
+        for frame in ImageSequence.Iterator(img):
+            if char_budget is not None and collected >= char_budget:
+                break
+            gray = ocr_preprocess.prepare_gray(frame, IMAGE_MAX_PIXELS)
+            tiles = split_bands(gray)
+            tiles_total += len(tiles)
+            if len(tiles) == 1:
+                pending.append(pool.submit(ocr_tiles, tiles))
+            else:
+                # Large frame: OCR its tiles concurrently, joined in order
+                parts = [pool.submit(ocr_tiles, [t]) for t in tiles]
+                pending.append(_Joined(parts))
+            drain(IMAGE_OCR_WORKERS)
+        drain(0)
+
+    if report is not None:
+        report.update({
+            "frames": n_frames,
+            "tiles": tiles_total,
+            "skipped_frames": n_frames - len(texts)
+        })
+    return "\n".join(t for t in texts if t)
+
+
+class _Joined:
+    """
+    Future-like wrapper joining several tile futures in order
+    """
+
+    def __init__(self, futures):
+        self.futures = futures
+
+    def result(self):
+        return "\n".join(f.result() for f in self.futures)
@@ -0,0 +1,252 @@
+"""
+Incremental parsing of a JSON object arriving in chunks.
+
+TopLevelFields is fed model output as it streams and returns each top-level
+(key, value) pair as soon as that member's value is complete, so callers
+can forward "summary" while "risks" is still being generated. Text before
+the opening brace (such as a ```json fence) is ignored.
+
+recover_fields applies the same parser to a complete but damaged response:
+fields that parsed are kept, values with trailing commas are cleaned up,
+and a value cut off by the output token limit is closed at its last
+complete element.
+"""
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class TopLevelFields:
+    def __init__(self):
+        self.fields = {}
+        self.errors = []
+        # Raw text of values that were complete but not valid JSON
+        self.failed = {}
+        self.state = "start"
+        self._key = []
+        self._value = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self):
+        return self.state == "done"
+
+    @property
+    def pending(self):
+        """
+        (key, raw text) of a value still being received, or None
+        """
+        if self.state != "value" or not self._value:
+            return None
+        try:
+            key = json.loads('"' + "".join(self._key) + '"')
+        except ValueError:
+            return None
+        return key, "".join(self._value)
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of text; returns the (key, value) pairs
+        completed by it, in order
+        """
+        completed = []
+        for ch in chunk:
+            state = self.state
+            if state == "start":
+                if ch == "{":
+                    self.state = "before_key"
+            elif state == "before_key":
+                if ch == '"':
+                    self._key = []
+                    self.state = "key"
+                elif ch == "}":
+                    self.state = "done"
+            elif state == "key":
+                if self._escape:
+                    self._escape = False
+                    self._key.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._key.append(ch)
+                elif ch == '"':
+                    self.state = "colon"
+                else:
+                    self._key.append(ch)
+            elif state == "colon":
+                if ch == ":":
+                    self._value = []
+                    self._depth = 0
+                    self._in_string = False
+                    self.state = "value"
+            elif state == "value":
+                self._value_char(ch, completed)
+            elif state == "after_value":
+                if ch == ",":
+                    self.state = "before_key"
+                elif ch == "}":
+                    self.state = "done"
+        return completed
+
+    def _value_char(self, ch, completed):
+        value = self._value
+        if self._in_string:
+            value.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._finish(completed, "after_value")
+            return
+        if not value and ch in WHITESPACE:
+            return
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            if self._depth == 0:
+                # The object closed right after a number/literal value
+                self._finish(completed, "done")
+                return
+            self._depth -= 1
+            if self._depth == 0:
+                value.append(ch)
+                self._finish(completed, "after_value")
+                return
+        elif ch == "," and self._depth == 0:
+            self._finish(completed, "before_key")
+            return
+        value.append(ch)
+
+    def _finish(self, completed, next_state):
+        self.state = next_state
+        try:
+            key = json.loads('"' + "".join(self._key) + '"')
+        except ValueError as e:
+            self.errors.append(f"{''.join(self._key)[:40]}: {e}")
+            return
+        try:
+            value = json.loads("".join(self._value))
+        except ValueError as e:
+            self.errors.append(f"{key[:40]}: {e}")
+            self.failed[key] = "".join(self._value)
+            return
+        self.fields[key] = value
+        completed.append((key, value))
+
+
+def strip_trailing_commas(text):
+    """
+    Remove commas directly before a closing bracket, outside strings
+    """
+    out, in_string, escape = [], False, False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "]}":
+            # Drop a comma (and the whitespace after it) before this bracket
+            i = len(out) - 1
+            while i >= 0 and out[i] in WHITESPACE:
+                i -= 1
+            if i >= 0 and out[i] == ",":
+                del out[i:]
+        out.append(ch)
+    return "".join(out)
+
+
+def close_truncated(text):
+    """
+    Parse a JSON array or object cut off part way: the unfinished trailing
+    element is dropped and the open containers are closed. Raises
+    ValueError if no complete prefix exists.
+    """
+    # Each frame is "[" or "{" plus, for objects, whether a key is expected
+    stack, in_string, escape = [], False, False
+    string_is_key = False
+    safe = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    safe = (i + 1, list(stack))
+            continue
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == "{key"
+        elif ch in "{[":
+            stack.append("{key" if ch == "{" else "[")
+            safe = (i + 1, list(stack))
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if stack and stack[-1] == "{value":
+                stack[-1] = "{key"
+            safe = (i + 1, list(stack))
+            if not stack:
+                break
+        elif ch == ":" and stack and stack[-1] == "{key":
+            stack[-1] = "{value"
+        elif ch == "," and stack:
+            # Everything before the comma is complete
+            safe = (i, list(stack))
+            if stack[-1] == "{value":
+                stack[-1] = "{key"
+    if safe is None:
+        raise ValueError("No complete JSON prefix")
+    end, frames = safe
+    closers = "".join("}" if frame.startswith("{") else "]" for frame in reversed(frames))
+    return json.loads(strip_trailing_commas(text[:end] + closers))
+
+
+def loads_tolerant(text):
+    """
+    json.loads, retried without trailing commas
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(strip_trailing_commas(text))
+
+
+def recover_fields(text):
+    """
+    Top-level fields of a model response, salvaging what a strict parse
+    would throw away. Returns (fields, truncated) where truncated names
+    the field closed early because the response was cut off.
+    """
+    parser = TopLevelFields()
+    parser.feed(text)
+    fields = dict(parser.fields)
+    for key, raw in parser.failed.items():
+        try:
+            fields[key] = loads_tolerant(raw)
+        except ValueError:
+            pass
+    truncated = set()
+    pending = parser.pending
+    if pending is not None:
+        key, raw = pending
+        try:
+            fields[key] = close_truncated(raw)
+            truncated.add(key)
+        except ValueError:
+            pass
+    return fields, truncated
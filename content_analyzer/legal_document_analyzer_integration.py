@@ -234,11 +234,14 @@ def chat_about_document(text, question):
     Returns:
         str: AI-generated answer
     """
+    # Sections most relevant to the question, within the context budget
+    # (pack_for_prompt in app.py)
+    document = pack_for_prompt(text, budget=2500, query=question)
     prompt = f"""
     Based on the following document, answer the question accurately and concisely.
     
     Document:
-    {text[:10000]}  # Limit for context window
+    {document}
     
     Question: {question}
     
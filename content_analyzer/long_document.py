@@ -0,0 +1,125 @@
+"""
+Map-reduce helpers for documents longer than one analysis window.
+
+split_segments cuts the text into roughly equal segments no longer than the
+window, preferring clause headings, then paragraph breaks, line breaks and
+sentence ends as cut points. merge_analyses combines the per-segment analyses
+into one result with the same 12 categories, dropping duplicate entries.
+"""
+import math
+import re
+
+from analysis_schema import ANALYSIS_FIELDS, IDENTITY_FIELDS
+
+# Start of a numbered clause ("12.", "4.2 Term") or heading line
+HEADING_RE = re.compile(
+    r"^[ \t]*(?:\d+(?:\.\d+)*[.)]?[ \t]+\S|"
+    r"(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|"
+    r"ANNEXURE|Annexure|APPENDIX|Appendix)\b|[A-Z][A-Z &,\-]{3,}$)", re.MULTILINE)
+
+# Cut points, best first, as (pattern, cut after the match rather than
+# before it)
+BOUNDARIES = [
+    (HEADING_RE, False),
+    (re.compile(r"\n[ \t]*\n"), False),
+    (re.compile(r"\n"), False),
+    (re.compile(r"[.;:](?=\s)"), True),
+]
+
+SEVERITY_RANK = {"high": 3, "medium": 2, "low": 1}
+UNKNOWN_JURISDICTION = {"", "not available", "not analyzed", "not specified", "not found"}
+
+
+def best_cut(text, lo, target, hi):
+    """
+    Position in [lo, hi] to end a segment at, nearest target among the
+    strongest kind of boundary present
+    """
+    for pattern, after in BOUNDARIES:
+        cuts = [m.end() if after else m.start() for m in pattern.finditer(text, lo, hi)]
+        cuts = [c for c in cuts if lo < c <= hi]
+        if cuts:
+            return min(cuts, key=lambda c: abs(c - target))
+    return hi
+
+
+def split_segments(text, max_chars, max_segments=None):
+    """
+    Split text into the fewest segments of at most max_chars, balanced in
+    length and cut at clause boundaries where possible. With max_segments,
+    segments grow beyond max_chars rather than exceed that count (the last
+    takes whatever is left).
+    """
+    if max_segments and len(text) > max_chars * max_segments:
+        # Headroom so segments cut short at a clause boundary do not push
+        # the rest past the last segment
+        max_chars = max(max_chars, math.ceil(len(text) * 1.25 / max_segments))
+    segments, start = [], 0
+    while len(text) - start > max_chars and (not max_segments or len(segments) < max_segments - 1):
+        remaining = math.ceil((len(text) - start) / max_chars)
+        target = start + (len(text) - start) // remaining
+        cut = best_cut(text, start + max_chars // 2, target, start + max_chars)
+        segments.append(text[start:cut])
+        start = cut
+    segments.append(text[start:])
+    return segments
+
+
+def _norm(value):
+    return re.sub(r"[^a-z0-9]+", " ", str(value).lower()).strip()
+
+
+def _identity(category, item):
+    fields = IDENTITY_FIELDS[category]
+    if not isinstance(item, dict) or not fields:
+        return _norm(item)
+    return tuple(_norm(item.get(f, "")) for f in fields)
+
+
+def merge_analyses(analyses):
+    """
+    Combine per-segment analyses: list categories are concatenated in
+    document order without duplicates, summaries are joined, and a clause
+    reported missing in one segment but present in another is dropped
+    """
+    summaries = {}
+    for analysis in analyses:
+        summary = analysis.get("summary")
+        if isinstance(summary, str) and summary.strip():
+            summaries.setdefault(_norm(summary), summary.strip())
+    merged = {"summary": " ".join(summaries.values())}
+
+    for category in IDENTITY_FIELDS:
+        items, index = [], {}
+        for analysis in analyses:
+            entries = analysis.get(category)
+            if not isinstance(entries, list):
+                continue
+            for item in entries:
+                key = _identity(category, item)
+                if key in index:
+                    # Keep the most severe rating of a repeated risk
+                    if category == "risks" and isinstance(item, dict):
+                        kept = items[index[key]]
+                        if SEVERITY_RANK.get(str(item.get("severity")).lower(), 0) > \
+                                SEVERITY_RANK.get(str(kept.get("severity")).lower(), 0):
+                            items[index[key]] = item
+                    continue
+                index[key] = len(items)
+                items.append(item)
+        merged[category] = items
+
+    present = {_identity("main_clauses", c)[0] for c in merged["main_clauses"] if isinstance(c, dict)}
+    merged["missing_clauses"] = [
+        c for c in merged["missing_clauses"]
+        if not (isinstance(c, dict) and _norm(c.get("clause", "")) in present)]
+
+    jurisdictions = []
+    for analysis in analyses:
+        value = analysis.get("jurisdiction")
+        if isinstance(value, str) and value.strip().lower() not in UNKNOWN_JURISDICTION \
+                and _norm(value) not in {_norm(j) for j in jurisdictions}:
+            jurisdictions.append(value.strip())
+    merged["jurisdiction"] = "; ".join(jurisdictions)
+
+    return {k: merged[k] for k in ANALYSIS_FIELDS}
@@ -0,0 +1,532 @@
+"""
+Asyncio model client with concurrency and rate limiting.
+
+Every model call in a worker goes through one AsyncModelClient running on a
+background event loop, so batch threads and concurrent requests share:
+
+- a cap on calls in flight (MODEL_CONCURRENCY),
+- token buckets for requests per minute and tokens per minute; prompts are
+  charged an estimate up front and responses are charged once their size is
+  known,
+- retries with full-jitter exponential backoff on 429 (and 503 overloaded)
+  responses, raising RateLimited (429) or ModelUnavailable (503) once they
+  are exhausted,
+- an optional CircuitBreaker: after repeated failed or slow calls it opens
+  and calls fail at once with CircuitOpen, until a single probe call
+  succeeds after a cool-down.
+
+Sync Flask code calls generate_sync(), or stream_sync() to receive the
+output in pieces as it is generated. A call backend is an async function
+(prompt, config) -> (text, output_tokens or None), and a stream backend an
+async generator of text pieces; gemini_call/gemini_stream wrap a
+google.generativeai model and http_call/http_stream talk to
+stub_model_server.py. Streams are only retried if they fail before the
+first piece arrives.
+"""
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Rough English-text ratio, used for budgeting before the model reports usage
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, len(text or "") // CHARS_PER_TOKEN)
+
+
+class RateLimited(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a model that has been failing
+    """
+
+
+class ModelUnavailable(Exception):
+    """
+    The model service stayed overloaded or unavailable through every retry
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryableError(Exception):
+    """
+    Raised by call backends for responses worth retrying
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def is_retryable(e):
+    if isinstance(e, RetryableError):
+        return True
+    code = getattr(e, "code", None)
+    if code in (429, 503):
+        return True
+    return type(e).__name__ in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable")
+
+
+def is_throttled(e):
+    """
+    Quota errors say nothing about the model's health
+    """
+    if getattr(e, "status", None) == 429 or getattr(e, "code", None) == 429:
+        return True
+    return type(e).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+class CircuitBreaker:
+    """
+    Closed until `failure_threshold` calls in a row fail or take longer than
+    `slow_call_s` (to their first piece, for streamed calls); then open, rejecting calls for `reset_timeout` seconds,
+    after which one probe call is let through (half open) and its outcome
+    closes or reopens the circuit. Only used from the client's event loop.
+    """
+
+    def __init__(self, failure_threshold=5, slow_call_s=30.0, reset_timeout=30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_call_s = slow_call_s
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = None
+        self._probing = False
+        self.stats = {"failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def rejecting(self):
+        """
+        True while calls would be rejected, without claiming the half-open
+        probe; checked before a call spends rate-limit budget
+        """
+        if self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout:
+            return True
+        return self.state == "half_open" and self._probing
+
+    def allow(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.stats["rejected"] += 1
+                return False
+            self._probing = True
+        return True
+
+    def record(self, elapsed, failed=False):
+        """
+        Outcome of an allowed call; a call slower than slow_call_s counts
+        as a failure even if it succeeded
+        """
+        self._probing = False
+        slow = elapsed >= self.slow_call_s
+        if slow:
+            self.stats["slow_calls"] += 1
+        if failed:
+            self.stats["failures"] += 1
+        if not (failed or slow):
+            self.consecutive = 0
+            self.state = "closed"
+            return
+        self.consecutive += 1
+        if self.state == "half_open" or self.consecutive >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+                print(f"Model circuit open after {self.consecutive} failed or slow calls")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        An allowed call ended without an outcome (throttled or abandoned)
+        """
+        self._probing = False
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats.update({
+            "state": self.state,
+            "consecutive_failures": self.consecutive,
+            "retry_in_s": round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            if self.state == "open" else 0.0,
+        })
+        return stats
+
+
+class TokenBucket:
+    """
+    `per_minute` units refilled continuously, bursting up to one minute's
+    worth. Only used from the client's event loop, so no locking is needed.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount):
+        """
+        Wait until `amount` units are available and take them. Returns the
+        seconds spent waiting.
+        """
+        if self.capacity <= 0:
+            return 0.0
+        # A single request larger than the whole bucket waits for a full one
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return waited
+            delay = (amount - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def charge(self, amount):
+        """
+        Take units after the fact (may go negative, delaying later calls)
+        """
+        if self.capacity > 0:
+            self._refill()
+            self.tokens -= amount
+
+
+class AsyncModelClient:
+    def __init__(self, call, concurrency=4, requests_per_minute=60, tokens_per_minute=1_000_000,
+                 max_retries=5, base_delay=1.0, max_delay=30.0, stream_call=None, breaker=None):
+        self.call = call
+        self.stream_call = stream_call
+        self.breaker = breaker
+        self.concurrency = max(1, concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "unavailable": 0, "failures": 0,
+                      "in_flight": 0, "throttle_wait_s": 0.0}
+        self._semaphore = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Full jitter: uniform in [0, min(max_delay, base * 2**attempt)], but
+        never sooner than a server-provided retry_after
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def _check_breaker(self):
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpen("Model circuit open after repeated failures")
+
+    def _reject_if_open(self):
+        """
+        Fail at once while the circuit is open, before waiting on or
+        spending the request and token budgets
+        """
+        if self.breaker is not None and self.breaker.rejecting():
+            self.breaker.stats["rejected"] += 1
+            self.stats["failures"] += 1
+            raise CircuitOpen("Model circuit open after repeated failures")
+
+    def _record(self, started, error=None):
+        """
+        Report a call's outcome to the breaker; quota errors and cancelled
+        calls within the slow threshold are not held against the model
+        """
+        if self.breaker is None:
+            return
+        elapsed = time.monotonic() - started
+        if error is not None and (is_throttled(error) or
+                                  (isinstance(error, asyncio.CancelledError)
+                                   and elapsed < self.breaker.slow_call_s)):
+            self.breaker.release()
+        else:
+            self.breaker.record(elapsed, failed=error is not None)
+
+    async def _call_once(self, prompt, config):
+        async with self._semaphore:
+            self._check_breaker()
+            self.stats["calls"] += 1
+            self.stats["in_flight"] += 1
+            started = time.monotonic()
+            try:
+                result = await self.call(prompt, config)
+            except BaseException as e:
+                # Includes cancellation by a caller's deadline
+                self._record(started, e)
+                raise
+            finally:
+                self.stats["in_flight"] -= 1
+            self._record(started)
+            return result
+
+    async def _admit(self, prompt_tokens):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(prompt_tokens)
+        self.stats["throttle_wait_s"] += waited
+
+    async def _retry_or_raise(self, attempt, e):
+        """
+        Sleep before the next attempt, or raise if the error is not
+        retryable or retries are exhausted
+        """
+        if isinstance(e, CircuitOpen) or not is_retryable(e):
+            self.stats["failures"] += 1
+            raise e
+        retry_after = getattr(e, "retry_after", None)
+        if attempt == self.max_retries:
+            if is_throttled(e):
+                self.stats["rate_limited"] += 1
+                raise RateLimited(f"Model rate limited after {attempt + 1} attempts: {e}", retry_after)
+            self.stats["unavailable"] += 1
+            raise ModelUnavailable(f"Model unavailable after {attempt + 1} attempts: {e}", retry_after)
+        self.stats["retries"] += 1
+        delay = self.backoff(attempt, retry_after)
+        print(f"Model call throttled, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+        await asyncio.sleep(delay)
+
+    async def generate(self, prompt, config=None):
+        if self.stream_call is not None:
+            # Streamed underneath, so the breaker times the first piece
+            # rather than a full response, which takes most of a minute
+            # near max_output_tokens
+            pieces = []
+            async for piece in self.stream(prompt, config):
+                pieces.append(piece)
+            return "".join(pieces)
+        prompt_tokens = estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self._reject_if_open()
+            await self._admit(prompt_tokens)
+            try:
+                text, output_tokens = await self._call_once(prompt, config or {})
+            except Exception as e:
+                await self._retry_or_raise(attempt, e)
+                continue
+            self.tokens.charge(output_tokens if output_tokens is not None else estimate_tokens(text))
+            return text
+
+    async def stream(self, prompt, config=None):
+        """
+        Async generator of output pieces. Without a stream backend the
+        whole response arrives as one piece.
+        """
+        if self.stream_call is None:
+            yield await self.generate(prompt, config)
+            return
+        prompt_tokens = estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self._reject_if_open()
+            await self._admit(prompt_tokens)
+            received = []
+            try:
+                async with self._semaphore:
+                    self._check_breaker()
+                    self.stats["calls"] += 1
+                    self.stats["in_flight"] += 1
+                    started = time.monotonic()
+                    try:
+                        async for piece in self.stream_call(prompt, config or {}):
+                            if not received:
+                                # A stream's health is its time to first piece
+                                self._record(started)
+                            received.append(piece)
+                            yield piece
+                        if not received:
+                            self._record(started)
+                    except BaseException as e:
+                        if not received:
+                            self._record(started, e)
+                        raise
+                    finally:
+                        self.stats["in_flight"] -= 1
+            except Exception as e:
+                if received:
+                    # Part of the output was already passed on
+                    self.stats["failures"] += 1
+                    raise
+                await self._retry_or_raise(attempt, e)
+                continue
+            self.tokens.charge(estimate_tokens("".join(received)))
+            return
+
+    # Sync bridge: one event loop thread per worker process
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                # Blocking backends (http_call) run on the default executor,
+                # which must not be the bottleneck below the concurrency cap
+                self._loop.set_default_executor(
+                    ThreadPoolExecutor(self.concurrency, thread_name_prefix="model-call"))
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="model-client", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def generate_sync(self, prompt, config=None, timeout=None):
+        """
+        Run generate() on the background loop and wait for the text
+        """
+        future = asyncio.run_coroutine_threadsafe(self.generate(prompt, config), self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def stream_sync(self, prompt, config=None, timeout=None):
+        """
+        Generator of output pieces from stream() on the background loop;
+        timeout applies to the wait for each piece
+        """
+        pieces = queue.Queue()
+
+        async def pump():
+            try:
+                async for piece in self.stream(prompt, config):
+                    pieces.put(piece)
+                pieces.put(None)
+            except Exception as e:
+                pieces.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                try:
+                    item = pieces.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("Model stream stalled")
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats["throttle_wait_s"] = round(stats["throttle_wait_s"], 2)
+        stats["concurrency"] = self.concurrency
+        stats["breaker"] = self.breaker.snapshot() if self.breaker is not None else None
+        return stats
+
+
+def gemini_call(model):
+    """
+    Call backend for a google.generativeai GenerativeModel
+    """
+    async def call(prompt, config):
+        response = await model.generate_content_async(prompt, generation_config=config)
+        usage = getattr(response, "usage_metadata", None)
+        return response.text, getattr(usage, "candidates_token_count", None)
+    return call
+
+
+def gemini_stream(model):
+    """
+    Stream backend for a google.generativeai GenerativeModel
+    """
+    async def call(prompt, config):
+        response = await model.generate_content_async(prompt, generation_config=config, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish reason)
+                continue
+            if text:
+                yield text
+    return call
+
+
+def _post(url, payload, timeout):
+    body = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        return urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code in (429, 503):
+            retry_after = e.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {e.code}", e.code,
+                                 float(retry_after) if retry_after else None)
+        raise
+
+
+def http_call(url, timeout=120):
+    """
+    Call backend for stub_model_server.py (or anything speaking its
+    protocol: POST {"prompt", "config"} -> {"text", "output_tokens"})
+    """
+    def post(prompt, config):
+        with _post(url, {"prompt": prompt, "config": config}, timeout) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+        return data["text"], data.get("output_tokens")
+
+    async def call(prompt, config):
+        return await asyncio.get_running_loop().run_in_executor(None, post, prompt, config)
+    return call
+
+
+def http_stream(url, timeout=120):
+    """
+    Stream backend for stub_model_server.py: with "stream": true it answers
+    with one {"text": piece} JSON line per piece
+    """
+    async def call(prompt, config):
+        loop = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+
+        def read():
+            try:
+                with _post(url, {"prompt": prompt, "config": config, "stream": True}, timeout) as resp:
+                    for line in resp:
+                        if line.strip():
+                            loop.call_soon_threadsafe(pieces.put_nowait, json.loads(line)["text"])
+                loop.call_soon_threadsafe(pieces.put_nowait, None)
+            except Exception as e:
+                loop.call_soon_threadsafe(pieces.put_nowait, e)
+
+        loop.run_in_executor(None, read)
+        while True:
+            item = await pieces.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    return call
@@ -0,0 +1,133 @@
+"""
+OCR backend layer.
+
+pytesseract spawns a tesseract process per image and exchanges data through
+temp files, so every call pays process start-up and model loading. When
+tesserocr is installed, images are instead recognised by long-lived
+in-process engines (PyTessBaseAPI) checked out from a small pool and reused
+across requests. pytesseract stays as the fallback.
+
+OCR_BACKEND selects the backend: "auto" (default), "tesserocr" or
+"pytesseract".
+"""
+import os
+import queue
+import threading
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto").lower()
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+# Engines per process. Each holds a loaded model (~tens of MB), and a
+# PyTessBaseAPI must never be used by two threads at once.
+OCR_ENGINE_POOL = int(os.environ.get("OCR_ENGINE_POOL", 2))
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img, lang=OCR_LANG)
+
+
+class TesserocrBackend:
+    """
+    Pool of initialised tesserocr engines. Engines are created lazily, up to
+    `size`, and returned to the pool after each image.
+    """
+    name = "tesserocr"
+
+    def __init__(self, size=OCR_ENGINE_POOL, lang=OCR_LANG):
+        self.size = max(1, size)
+        self.lang = lang
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_engine(self):
+        path = os.environ.get("TESSDATA_PREFIX")
+        if path:
+            return tesserocr.PyTessBaseAPI(path=path, lang=self.lang)
+        return tesserocr.PyTessBaseAPI(lang=self.lang)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._new_engine()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def image_to_string(self, img):
+        engine = self._checkout()
+        try:
+            engine.SetImage(img)
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+            self._idle.put(engine)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+
+
+_backend = None
+_fallback = PytesseractBackend()
+
+
+def get_backend(name=None):
+    """
+    Return the configured backend, creating it on first use in this process
+    """
+    global _backend
+    name = (name or OCR_BACKEND).lower()
+    if name == "pytesseract":
+        return _fallback
+    if _backend is None:
+        if tesserocr is None:
+            if name == "tesserocr":
+                print("tesserocr not installed - using pytesseract")
+            _backend = _fallback
+        else:
+            _backend = TesserocrBackend()
+    return _backend
+
+
+def image_to_string(img, backend=None):
+    """
+    OCR a PIL image with the configured backend, falling back to pytesseract
+    if the in-process engine fails
+    """
+    engine = get_backend(backend)
+    if engine is _fallback:
+        text = _fallback.image_to_string(img)
+    else:
+        try:
+            text = engine.image_to_string(img)
+        except Exception as e:
+            print(f"{engine.name} OCR error, falling back to pytesseract: {e}")
+            text = _fallback.image_to_string(img)
+    # Tesseract ends each page with a form feed, which is the page separator
+    # of extractor output (text_normalize.PAGE_BREAK)
+    return text.rstrip("\f")
@@ -0,0 +1,161 @@
+"""
+Image preprocessing shared by the PDF OCR fallback and extract_image.
+
+Tesseract is most accurate when text lines are roughly 30-40 px tall; more
+pixels than that only cost time and memory. Instead of rendering every page
+at a fixed 200 dpi in RGB, we estimate the line height from a cheap
+grayscale thumbnail, pick the DPI (or downscale factor) that brings lines to
+that height, cap the total pixel count, and hand tesseract a single-channel
+image.
+"""
+import os
+
+import fitz
+from PIL import Image, ImageOps
+
+OCR_MIN_DPI = int(os.environ.get("OCR_MIN_DPI", 150))
+OCR_MAX_DPI = int(os.environ.get("OCR_MAX_DPI", 300))
+OCR_MAX_PIXELS = int(os.environ.get("OCR_MAX_PIXELS", 12_000_000))
+# "gray" keeps 8-bit grayscale; "binary" also applies an Otsu threshold
+OCR_COLOR_MODE = os.environ.get("OCR_COLOR_MODE", "gray").lower()
+
+TARGET_LINE_PX = 36
+PROBE_DPI = 50
+# A row counts as text when its mean brightness drops this far below the
+# page background.
+INK_ROW_DELTA = 8
+
+
+def estimate_line_height(gray):
+    """
+    Median height in pixels of the dark row bands in a grayscale image,
+    or None when no text-like bands are found.
+
+    Collapsing the image to one column with a box filter gives each row's
+    mean brightness without touching pixels in Python.
+    """
+    if gray.height < 8:
+        return None
+    profile = list(gray.resize((1, gray.height), Image.BOX).getdata())
+    background = sorted(profile)[int(len(profile) * 0.9)]
+    runs, run = [], 0
+    for value in profile:
+        if value < background - INK_ROW_DELTA:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    # Ignore single-row specks and bands taller than a quarter of the page
+    runs = [r for r in runs if 2 <= r <= gray.height // 4]
+    if len(runs) < 3:
+        return None
+    runs.sort()
+    return runs[len(runs) // 2]
+
+
+def choose_dpi(page):
+    """
+    Pick a render DPI for a PDF page from its size and glyph density
+    """
+    probe = page.get_pixmap(dpi=PROBE_DPI, colorspace=fitz.csGRAY)
+    thumb = Image.frombytes("L", [probe.width, probe.height], probe.samples)
+    line = estimate_line_height(thumb)
+    probe = None
+
+    dpi = OCR_MAX_DPI if line is None else PROBE_DPI * TARGET_LINE_PX / line
+    dpi = max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+
+    # Cap the pixel count for oversized pages (A3 drawings, posters)
+    width_in, height_in = page.rect.width / 72.0, page.rect.height / 72.0
+    area = max(width_in * height_in, 1e-6)
+    max_dpi_for_pixels = (OCR_MAX_PIXELS / area) ** 0.5
+    return int(min(dpi, max_dpi_for_pixels))
+
+
+def finish(gray):
+    """
+    Apply the configured colour mode to a grayscale image
+    """
+    if OCR_COLOR_MODE == "binary":
+        threshold = otsu_threshold(gray.histogram())
+        return gray.point(lambda p: 255 if p > threshold else 0, mode="1")
+    return gray
+
+
+def render_page(page):
+    """
+    Rasterize a PDF page for OCR at an adaptive DPI, in grayscale
+    """
+    dpi = choose_dpi(page)
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    # Release the pixmap before OCR runs on the image
+    pix = None
+    return finish(img)
+
+
+def prepare_gray(img, max_pixels=None):
+    """
+    Normalise an uploaded photo or scan for OCR: honour EXIF rotation,
+    convert to grayscale and downscale oversized images to at most
+    max_pixels (OCR_MAX_PIXELS by default)
+    """
+    max_pixels = max_pixels or OCR_MAX_PIXELS
+    # JPEG can decode straight at a reduced scale; saves the full-size
+    # raster for huge phone photos and scans
+    if img.width * img.height > max_pixels and img.format == "JPEG":
+        shrink = (max_pixels / (img.width * img.height)) ** 0.5
+        img.draft("L", (int(img.width * shrink), int(img.height * shrink)))
+    img = ImageOps.exif_transpose(img)
+    gray = img.convert("L")
+
+    scale = 1.0
+    probe_scale = min(1.0, 1000.0 / max(gray.size))
+    thumb = gray.resize((max(1, int(gray.width * probe_scale)),
+                         max(1, int(gray.height * probe_scale))), Image.BOX)
+    line = estimate_line_height(thumb)
+    if line is not None:
+        line_full = line / probe_scale
+        if line_full > TARGET_LINE_PX:
+            scale = TARGET_LINE_PX / line_full
+    pixels = gray.width * gray.height * scale * scale
+    if pixels > max_pixels:
+        scale *= (max_pixels / pixels) ** 0.5
+
+    if scale < 0.95:
+        gray = gray.resize((max(1, int(gray.width * scale)),
+                            max(1, int(gray.height * scale))), Image.LANCZOS)
+    return gray
+
+
+def prepare_image(img, max_pixels=None):
+    return finish(prepare_gray(img, max_pixels))
+
+
+def otsu_threshold(histogram):
+    """
+    Otsu's threshold from a 256-bin grayscale histogram
+    """
+    hist = histogram[:256]
+    total = sum(hist)
+    if not total:
+        return 127
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg, weight_bg = 0.0, 0
+    best, threshold = -1.0, 127
+    for i, h in enumerate(hist):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
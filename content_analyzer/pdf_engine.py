@@ -0,0 +1,357 @@
+"""
+Page-parallel PDF extraction engine.
+
+Pages are split into contiguous batches and fanned out to a bounded process
+pool. Each worker reopens the document, extracts its pages and returns
+(page_index, text) pairs, which are put back in page order.
+
+A source is either a path (spooled uploads; workers map the file themselves,
+so nothing is pickled but the path) or the document bytes.
+"""
+import os
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+import fitz
+
+import ocr_backend
+import ocr_preprocess
+import upload_spool
+
+# Worker counts for the text-layer and OCR paths. 1 disables the pool.
+PDF_TEXT_WORKERS = int(os.environ.get("PDF_TEXT_WORKERS", os.cpu_count() or 1))
+PDF_OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", os.cpu_count() or 1))
+
+# Documents shorter than this are extracted inline; the pool round trip
+# costs more than it saves on a handful of pages.
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 4))
+
+# Batches per worker. More than one keeps workers busy when some pages are
+# much slower than others (dense scans next to blank pages).
+PDF_BATCHES_PER_WORKER = 2
+
+# Text-layer engine: "auto" probes each document, or force "fitz" (fast)
+# or "pdfplumber" (layout-aware)
+PDF_TEXT_ENGINE = os.environ.get("PDF_TEXT_ENGINE", "auto").lower()
+
+# Pages looked at by the engine probe, and the number of vector drawings
+# (table rulings) on one page that marks it as layout-heavy
+PROBE_PAGES = 3
+PROBE_MIN_RULINGS = 20
+
+# A page whose text layer has fewer non-blank characters than this is
+# treated as scanned and sent to OCR.
+PDF_MIN_PAGE_CHARS = int(os.environ.get("PDF_MIN_PAGE_CHARS", 25))
+
+_pools = {}
+# Request threads (batch files) may ask for a pool at the same time
+_pools_lock = threading.Lock()
+
+
+def _pool_context():
+    """
+    Start method for pool workers. Pools are created from a threaded
+    gunicorn worker, and a plain fork would copy locks, open uploads and
+    single-flight flocks held by other threads into long-lived children;
+    forkserver starts them from a clean process with the PDF libraries
+    already imported.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_engine"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool(kind, workers):
+    """
+    Return the process pool for a path ("text" or "ocr"), creating it on
+    first use so each gunicorn worker builds its own after forking.
+    """
+    with _pools_lock:
+        pool = _pools.get((kind, workers))
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _pools[(kind, workers)] = pool
+        return pool
+
+
+def _discard_pool(kind, workers, pool):
+    """
+    Forget a pool whose worker died, so the next call builds a new one
+    """
+    with _pools_lock:
+        if _pools.get((kind, workers)) is pool:
+            del _pools[(kind, workers)]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+atexit.register(_shutdown_pools)
+
+
+def page_batches(pages, workers, per_worker=PDF_BATCHES_PER_WORKER):
+    """
+    Split a sorted list of page indices into contiguous, roughly equal batches
+    """
+    pages = list(pages)
+    n_batches = max(1, min(len(pages), workers * per_worker))
+    size, extra = divmod(len(pages), n_batches)
+    batches, start = [], 0
+    for i in range(n_batches):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            batches.append(pages[start:end])
+        start = end
+    return batches
+
+
+def open_fitz(source):
+    """
+    Open a PDF from a path (MuPDF reads the file lazily) or from bytes
+    """
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def count_pages(source):
+    with open_fitz(source) as doc:
+        return doc.page_count
+
+
+def has_text_layer(text):
+    """
+    True when a page's text layer is worth keeping instead of OCRing it
+    """
+    return bool(text) and len(text.strip()) >= PDF_MIN_PAGE_CHARS
+
+
+# Worker functions (module level so they can be pickled)
+def plumber_text_batch(source, pages):
+    """
+    Extract the text layer of the given pages with pdfplumber (layout-aware,
+    slow). A page that fails to parse comes back as None so the caller can
+    route it to OCR.
+    """
+    results = []
+    with upload_spool.open_source(source) as f, pdfplumber.open(f) as pdf:
+        for i in pages:
+            try:
+                page = pdf.pages[i]
+                results.append((i, page.extract_text()))
+                # Drop the page's parsed layout objects before the next page
+                page.close()
+            except Exception as e:
+                print(f"PDF page {i + 1} text error: {e}")
+                results.append((i, None))
+    return results
+
+
+def fitz_text_batch(source, pages):
+    """
+    Extract the text layer of the given pages with MuPDF's native text
+    extraction (fast, reading order from the content stream)
+    """
+    results = []
+    with open_fitz(source) as doc:
+        for i in pages:
+            try:
+                results.append((i, doc[i].get_text()))
+            except Exception as e:
+                print(f"PDF page {i + 1} text error: {e}")
+                results.append((i, None))
+    return results
+
+
+TEXT_ENGINES = {
+    "fitz": fitz_text_batch,
+    "pdfplumber": plumber_text_batch,
+}
+
+
+def probe_engine(source):
+    """
+    Pick a text engine from a cheap look at the first few pages. Ruled
+    tables and multi-column layouts go to pdfplumber, whose layout analysis
+    keeps them readable; plain running text (and scans, which are OCRed
+    anyway) go to fitz.
+    """
+    with open_fitz(source) as doc:
+        for i in range(min(PROBE_PAGES, doc.page_count)):
+            page = doc[i]
+            if len(page.get_drawings()) >= PROBE_MIN_RULINGS:
+                return "pdfplumber"
+            # Left edges of substantial text blocks, in quarter-inch buckets
+            starts = {}
+            for block in page.get_text("blocks"):
+                if block[6] == 0 and len(block[4].strip()) >= 40:
+                    bucket = round(block[0] / 18)
+                    starts[bucket] = starts.get(bucket, 0) + 1
+            columns = [b * 18 for b, n in starts.items() if n >= 3]
+            if len(columns) >= 2 and max(columns) - min(columns) > page.rect.width * 0.3:
+                return "pdfplumber"
+    return "fitz"
+
+
+def choose_engine(source, requested=None):
+    """
+    Resolve a requested engine name ("auto", "fitz", "pdfplumber" or None
+    for the PDF_TEXT_ENGINE default) to a concrete engine
+    """
+    engine = (requested or PDF_TEXT_ENGINE).lower()
+    if engine == "auto":
+        try:
+            return probe_engine(source)
+        except Exception as e:
+            print(f"PDF engine probe error: {e}")
+            return "pdfplumber"
+    if engine not in TEXT_ENGINES:
+        raise ValueError(f"Unknown PDF text engine: {engine}")
+    return engine
+
+
+def ocr_page(page):
+    return ocr_backend.image_to_string(ocr_preprocess.render_page(page))
+
+
+def ocr_batch(source, pages):
+    results = []
+    with open_fitz(source) as doc:
+        for i in pages:
+            try:
+                results.append((i, ocr_page(doc[i])))
+            except Exception as e:
+                print(f"PDF page {i + 1} OCR error: {e}")
+                results.append((i, None))
+    return results
+
+
+def run_pages(batch_fn, source, pages, workers, kind):
+    """
+    Run batch_fn over the given page indices and return {page_index: text}.
+
+    Falls back to a single inline call when the pool is disabled or there
+    are too few pages to benefit. A pool broken by a dead worker process
+    is replaced and the call retried once; other worker exceptions
+    propagate so callers keep their existing fallback behaviour.
+    """
+    pages = list(pages)
+    if not pages:
+        return {}
+    if workers <= 1 or len(pages) < PDF_PARALLEL_MIN_PAGES:
+        results = [batch_fn(source, pages)]
+    else:
+        for attempt in range(2):
+            pool = _get_pool(kind, workers)
+            try:
+                futures = [pool.submit(batch_fn, source, batch)
+                           for batch in page_batches(pages, workers)]
+                results = [f.result() for f in futures]
+                break
+            except BrokenProcessPool as e:
+                print(f"PDF {kind} pool broken, recreating: {e}")
+                _discard_pool(kind, workers, pool)
+                if attempt:
+                    raise
+    return {i: text for batch in results for i, text in batch}
+
+
+def extract_text_pages(source, page_count=None, workers=None, engine="pdfplumber"):
+    """
+    Extract the text layer of every page with the given engine
+    """
+    if page_count is None:
+        page_count = count_pages(source)
+    workers = PDF_TEXT_WORKERS if workers is None else workers
+    found = run_pages(TEXT_ENGINES[engine], source, range(page_count), workers, "text")
+    return [found.get(i) for i in range(page_count)]
+
+
+def ocr_pages(source, page_count=None, workers=None, pages=None):
+    """
+    Rasterize and OCR every page, or only the given page indices
+    """
+    if page_count is None:
+        page_count = count_pages(source)
+    if pages is None:
+        pages = range(page_count)
+    workers = PDF_OCR_WORKERS if workers is None else workers
+    found = run_pages(ocr_batch, source, pages, workers, "ocr")
+    return [found.get(i) for i in range(page_count)]
+
+
+def extract_window(source, pages, engine="pdfplumber"):
+    """
+    Hybrid extraction of the given pages: keep each page's text layer when it
+    is usable and OCR only the pages that lack one (scans, image-only pages,
+    parse failures).
+
+    Returns ({page_index: text}, {page_index: source}) where source is
+    "text", "ocr" or "empty".
+    """
+    try:
+        texts = run_pages(TEXT_ENGINES[engine], source, pages, PDF_TEXT_WORKERS, "text")
+    except Exception as e:
+        print(f"PDF extract error: {e}")
+        texts = {}
+
+    sources = {i: "text" if has_text_layer(texts.get(i)) else "ocr" for i in pages}
+    missing = [i for i in pages if sources[i] == "ocr"]
+    if missing:
+        print(f"OCR needed for {len(missing)}/{len(pages)} pages")
+        try:
+            ocr_texts = run_pages(ocr_batch, source, missing, PDF_OCR_WORKERS, "ocr")
+        except Exception as e:
+            print(f"PDF OCR error: {e}")
+            ocr_texts = {}
+        for i in missing:
+            # Keep a short text layer if OCR found nothing better
+            ocr_text = ocr_texts.get(i)
+            if ocr_text and ocr_text.strip():
+                texts[i] = ocr_text
+            elif texts.get(i) and texts[i].strip():
+                sources[i] = "text"
+            else:
+                sources[i] = "empty"
+    return texts, sources
+
+
+def window_size():
+    return max(PDF_PARALLEL_MIN_PAGES,
+               max(PDF_TEXT_WORKERS, PDF_OCR_WORKERS) * PDF_BATCHES_PER_WORKER)
+
+
+def extract_pages(source, page_count=None, char_budget=None, engine="pdfplumber"):
+    """
+    Extract every page, or with char_budget, extract pages in order one
+    window at a time and stop once enough text has been collected.
+    `engine` names the text-layer engine (see choose_engine).
+
+    Returns (texts, sources) where sources[i] is "text", "ocr", "empty" or
+    "skipped" for pages left unread because the budget was met.
+    """
+    if page_count is None:
+        page_count = count_pages(source)
+    texts, sources = [None] * page_count, ["skipped"] * page_count
+    step = page_count if char_budget is None else window_size()
+    collected = 0
+    for start in range(0, page_count, step):
+        window = list(range(start, min(page_count, start + step)))
+        found, found_sources = extract_window(source, window, engine)
+        for i in window:
+            texts[i] = found.get(i)
+            sources[i] = found_sources[i]
+            collected += len(texts[i] or "")
+        if char_budget is not None and collected >= char_budget:
+            break
+    return texts, sources
@@ -0,0 +1,109 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+Within a worker, the first caller for a key runs the work and later callers
+for the same key wait for its result. Across gunicorn workers, the leader
+also holds an exclusive flock on a lock file for the key, so a leader in
+another worker waits for it and then finds the result in the shared cache
+via `lookup` instead of repeating the work. Lock files are striped on the
+last characters of the (hash) key, which keeps their number bounded.
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the process only
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    STRIPE_CHARS = 3
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0, "cross_worker": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _file_lock(self, key):
+        if not self.lock_dir:
+            return None
+        path = os.path.join(self.lock_dir, key[-self.STRIPE_CHARS:] + ".lock")
+        # Close-on-exec, so spawned and exec'd children don't keep the lock
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_CLOEXEC", 0), 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except Exception:
+            os.close(fd)
+            raise
+        return fd
+
+    @staticmethod
+    def _file_unlock(fd):
+        # Unlock before closing: a child forked while the lock was held (a
+        # process pool created by compute) shares the open file, and closing
+        # only our descriptor would leave the stripe locked for its lifetime
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def do(self, key, compute, lookup=None):
+        """
+        Return compute() for key, running it once for all concurrent
+        callers. lookup() checks the shared cache and is called once the
+        cross-worker lock is held; a non-None result skips compute.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count("leaders")
+        try:
+            lock_fd = self._file_lock(key)
+            try:
+                value = lookup() if lookup else None
+                if value is not None:
+                    self._count("cross_worker")
+                else:
+                    value = compute()
+            finally:
+                if lock_fd is not None:
+                    self._file_unlock(lock_fd)
+            call.result = value
+            return value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["in_flight"] = len(self._calls)
+        return stats
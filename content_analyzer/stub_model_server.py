@@ -0,0 +1,162 @@
+"""
+Local stand-in for the Gemini API, for offline throughput testing.
+
+Answers POST requests of {"prompt", "config"} with {"text", "output_tokens"},
+where text is a canned analysis in the app's JSON schema. Latency is a fixed
+round trip plus a per-output-token generation time. With "stream": true in
+the request the text is sent as {"text": piece} JSON lines as it is
+"generated", the first after the round-trip latency. With --rpm it enforces a
+requests-per-minute quota and answers 429 with Retry-After like the real API.
+--truncate-rate cuts that fraction of answers off part way, as when the
+output token limit is hit.
+
+Usage:
+    python stub_model_server.py [--port 8765] [--latency 2.0] [--rpm 60]
+
+Then run the app against it with MODEL_STUB_URL=http://127.0.0.1:8765/.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "summary": "Stub analysis of the submitted document.",
+    "key_terms": [{"term": "Agreement", "definition": "This document"}],
+    "main_clauses": [{"name": "Payment Terms", "description": "When and how payment is made"}],
+    "critical_dates": [],
+    "parties": [{"name": "Party A", "role": "First party"}, {"name": "Party B", "role": "Second party"}],
+    "jurisdiction": "Not specified",
+    "obligations": [{"party": "Party A", "responsibility": "Pay the agreed amount"}],
+    "risks": [{"risk": "Stub risk", "severity": "low", "description": "Generated by the stub server"}],
+    "recommendations": ["Have a legal professional review this document"],
+    "missing_clauses": [],
+    "compliance_issues": [],
+    "next_steps": ["Review document with legal counsel"]
+}
+CANNED_TEXT = "```json\n" + json.dumps(CANNED_ANALYSIS, indent=2) + "\n```"
+# Same rough ratio as model_client.estimate_tokens
+OUTPUT_TOKENS = len(CANNED_TEXT) // 4
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        retry_after = server.admit()
+        if retry_after is not None:
+            server.count("throttled")
+            self.send_response(429)
+            self.send_header("Retry-After", f"{retry_after:.2f}")
+            self.end_headers()
+            return
+        if random.random() < server.error_rate:
+            server.count("errors")
+            self.send_response(503)
+            self.end_headers()
+            return
+        text = CANNED_TEXT
+        if random.random() < server.truncate_rate:
+            server.count("truncated")
+            text = text[:random.randint(len(text) // 4, len(text) - 10)]
+        if request.get("stream"):
+            self.stream_text(server, text)
+            return
+        time.sleep(server.latency + OUTPUT_TOKENS * server.token_ms / 1000)
+        server.count("served")
+        body = json.dumps({"text": text, "output_tokens": len(text) // 4}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_text(self, server, text):
+        time.sleep(server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        # About four tokens per piece
+        for i in range(0, len(text), 16):
+            time.sleep(4 * server.token_ms / 1000)
+            self.wfile.write((json.dumps({"text": text[i:i + 16]}) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        server.count("served")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=2.0, token_ms=0.0, rpm=0, error_rate=0.0, truncate_rate=0.0):
+        super().__init__(address, StubModelHandler)
+        self.latency = latency
+        self.token_ms = token_ms
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.stats = {"served": 0, "throttled": 0, "errors": 0, "truncated": 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def admit(self):
+        """
+        Sliding one-minute window quota; returns None if admitted, else the
+        seconds until a slot frees up
+        """
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm:
+                return 60 - (now - self._recent[0])
+            self._recent.append(now)
+        return None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+def start_in_thread(port=0, **options):
+    """
+    Start a stub server on a background thread (port 0 picks a free one)
+    """
+    server = StubModelServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds per call")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="extra ms per output token")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute quota (0 = none)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 503")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of answers cut off")
+    args = parser.parse_args()
+    server = StubModelServer(("127.0.0.1", args.port), args.latency, args.token_ms,
+                             args.rpm, args.error_rate, args.truncate_rate)
+    print(f"Stub model server on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Checks for json_stream's incremental parser and truncation repair; run with
+pytest or directly.
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from json_stream import TopLevelFields, close_truncated, recover_fields
+
+SAMPLE = {
+    "summary": 'Lease with a "break clause", braces {like} these and [brackets], and a \\ backslash.',
+    "key_terms": [{"term": "Rent", "definition": "Monthly payment, due on the 1st"},
+                  {"term": "Deposit", "definition": "Two months' rent: ₹ 50,000"}],
+    "critical_dates": [],
+    "risks": [{"risk": "Lock-in", "severity": "high", "description": "No exit before 11 months"}],
+    "recommendations": ["Negotiate the lock-in", "Add a \"force majeure\" clause"],
+    "score": 7,
+    "reviewed": True,
+}
+RESPONSE = "```json\n" + json.dumps(SAMPLE, indent=2, ensure_ascii=False) + "\n```"
+
+
+def check_partial(value, full):
+    """
+    A value recovered from a cut-off field holds only complete leading
+    entries of the full value (the last one possibly partial)
+    """
+    if isinstance(full, list):
+        assert isinstance(value, list) and len(value) <= len(full)
+        assert value[:-1] == full[:max(0, len(value) - 1)]
+        if value:
+            check_partial(value[-1], full[len(value) - 1])
+    elif isinstance(full, dict):
+        assert isinstance(value, dict)
+        items = list(value.items())
+        assert all(full[k] == v for k, v in items[:-1])
+        if items:
+            check_partial(items[-1][1], full[items[-1][0]])
+    else:
+        assert value == full
+
+
+def test_every_truncation_prefix():
+    for end in range(len(RESPONSE) + 1):
+        fields, truncated = recover_fields(RESPONSE[:end])
+        for name, value in fields.items():
+            if name in truncated:
+                check_partial(value, SAMPLE[name])
+            else:
+                assert value == SAMPLE[name], (end, name)
+    fields, truncated = recover_fields(RESPONSE)
+    assert fields == SAMPLE and not truncated
+
+
+def test_close_truncated_every_prefix():
+    raw = json.dumps(SAMPLE["key_terms"] + SAMPLE["risks"])
+    full = json.loads(raw)
+    for end in range(len(raw) + 1):
+        try:
+            value = close_truncated(raw[:end])
+        except ValueError:
+            assert end < raw.index("}")
+            continue
+        check_partial(value, full)
+    assert close_truncated(raw) == full
+
+
+def test_chunked_feed_matches_whole():
+    for size in range(1, 8):
+        parser = TopLevelFields()
+        completed = []
+        for i in range(0, len(RESPONSE), size):
+            completed.extend(parser.feed(RESPONSE[i:i + size]))
+        assert dict(completed) == SAMPLE and parser.done and not parser.errors
+
+
+def test_trailing_commas():
+    fields, truncated = recover_fields('{"a": [1, 2,], "b": {"x": "y,",  }, "c": "z",}')
+    assert fields == {"a": [1, 2], "b": {"x": "y,"}, "c": "z"} and not truncated
+    assert close_truncated('[1, 2, {"k": [3,],') == [1, 2, {"k": [3]}]
+
+
+def test_escaped_strings():
+    text = r'{"s": "he said \"stop\", then } and ]", "t": "back\\", "u": "é"}'
+    fields, _ = recover_fields(text)
+    assert fields == {"s": 'he said "stop", then } and ]', "t": "back\\", "u": "é"}
+    # Cut inside an escape sequence
+    fields, truncated = recover_fields('{"s": "done", "r": ["a\\"b", "c\\')
+    assert fields == {"s": "done", "r": ['a"b']} and truncated == {"r"}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,42 @@
+"""
+Checks for long_document.split_segments; run with pytest or directly.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from long_document import split_segments
+
+
+def clause_text(clauses):
+    body = "The Tenant shall keep the premises in good repair. " * 20
+    return "".join(f"{i}. Clause {i}\n{body}\n\n" for i in range(1, clauses + 1))
+
+
+def test_segments_cover_text_within_limit():
+    text = clause_text(200)
+    segments = split_segments(text, 50000)
+    assert "".join(segments) == text
+    assert all(len(s) <= 50000 for s in segments)
+    # Cut at clause headings
+    assert all(s.startswith(tuple("0123456789")) for s in segments)
+
+
+def test_segment_count_capped():
+    # About 1.25M characters, which would be 26 segments of 50,000
+    text = clause_text(1200)
+    segments = split_segments(text, 50000, max_segments=8)
+    assert len(segments) <= 8
+    assert "".join(segments) == text
+
+
+def test_short_text_single_segment():
+    assert split_segments("1. Term\nOne year.", 50000, max_segments=8) == ["1. Term\nOne year."]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
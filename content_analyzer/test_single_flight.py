@@ -0,0 +1,78 @@
+"""
+Checks for single_flight's cross-worker lock; run with pytest or directly.
+"""
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import SingleFlight, fcntl
+
+
+def test_lock_released_despite_forked_child():
+    if fcntl is None or not hasattr(os, "fork"):
+        return
+    with tempfile.TemporaryDirectory() as lock_dir:
+        flights = SingleFlight(lock_dir)
+        children = []
+
+        def fork_child():
+            # Like a process pool created on first use: the child outlives
+            # the flight and inherits the process's descriptors
+            pid = os.fork()
+            if pid == 0:
+                time.sleep(30)
+                os._exit(0)
+            children.append(pid)
+            return "first"
+
+        try:
+            assert flights.do("key-abc", fork_child) == "first"
+            # Same stripe, different key
+            results = []
+            waiter = threading.Thread(
+                target=lambda: results.append(flights.do("other-abc", lambda: "second")), daemon=True)
+            waiter.start()
+            waiter.join(5)
+            assert results == ["second"]
+        finally:
+            for pid in children:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+
+
+def test_followers_share_result():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", compute)))
+                 for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flights.snapshot()["coalesced"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert results == ["value"] * 4 and len(calls) == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,63 @@
+"""
+Checks for text_normalize; run with pytest or directly.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from text_normalize import PAGE_BREAK, normalize
+
+
+def page(number, body, header="ACME Properties - Lease Agreement", footer=None):
+    lines = [header] + body + [footer or f"Page {number} of 5", str(number)]
+    return "\n".join(lines)
+
+
+def test_running_headers_and_page_numbers_removed():
+    clauses = ["Parties", "Term", "Rent", "Deposit", "Termination"]
+    pages = [page(n, [f"{n}. {clause}", f"({n})", "2500"]) for n, clause in enumerate(clauses, 1)]
+    report = {}
+    text = normalize(PAGE_BREAK.join(pages), report)
+    # Repeated lines are kept once; the header is often the document title
+    assert text.count("ACME Properties") == 1 and text.count("Page") == 1
+    assert "\n1\n" not in text and not text.endswith("\n5")
+    # Numbers in the body stay
+    assert text.count("2500") == 5 and all(f"({n})" in text for n in range(1, 6))
+    assert report["repeated_lines_removed"] == 4 + 4 + 5
+
+
+def test_lone_numbers_at_page_edges_kept():
+    # Not a page sequence: the amounts and list markers are content
+    assert normalize("p1 line\n(1)\f(2)\nThe rent is\n2500\fx\n3") == \
+        "p1 line\n(1)\n(2)\nThe rent is\n2500\nx\n3"
+    pages = [f"Total due\n{amount}" for amount in (2500, 1800, 950, 4000)]
+    assert normalize(PAGE_BREAK.join(pages)).count("Total due") == 1
+    assert all(str(a) in normalize(PAGE_BREAK.join(pages)) for a in (2500, 1800, 950, 4000))
+
+
+def test_page_numbers_need_enough_pages():
+    assert normalize("Intro\n1\fBody\n2") == "Intro\n1\nBody\n2"
+    bodies = ["Recitals", "Payment terms", "Signatures"]
+    assert normalize(PAGE_BREAK.join(f"{body}\n- {n} -" for n, body in enumerate(bodies, 1))) == \
+        "Recitals\nPayment terms\nSignatures"
+
+
+def test_blank_ocr_pages_do_not_raise_threshold():
+    # Tesseract output ends every page with a form feed
+    pages = [f"CONFIDENTIAL\nClause {n} text\n\f" for n in range(6)]
+    assert normalize(PAGE_BREAK.join(pages)).count("CONFIDENTIAL") == 1
+
+
+def test_characters_and_spacing():
+    report = {}
+    text = normalize("The  ter-\nmination of the ﬁxed­ term\n\n\n\nends", report)
+    assert text == "The termination of the fixed term\n\nends"
+    assert report["words_rejoined"] == 1 and report["bytes_saved"] > 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,177 @@
+"""
+Clean-up of extracted text before classification and analysis.
+
+PDF pages repeat running headers, footers, page numbers and disclaimers, and
+OCR output splits words across lines with hyphens, keeps typographic
+ligatures and pads with whitespace. All of it costs prompt and response
+tokens without telling the model anything. normalize() takes the pages of
+a document (separated by PAGE_BREAK) and:
+
+- removes repeats of lines found at the top or bottom of at least
+  REPEAT_MIN_SHARE of the pages, comparing them with digits masked so
+  "Page 3 of 12" matches "Page 4 of 12";
+- removes bare page numbers ("3", "- 3 -") from the first or last line of
+  a page, when they count up with the pages on as many pages; a lone
+  number elsewhere is an amount or a list marker;
+- joins words hyphenated across a line break;
+- replaces ligatures and invisible characters;
+- collapses runs of spaces and blank lines.
+
+Paragraph breaks and line starts are kept, since clause headings are found
+at the start of a line.
+"""
+import math
+import re
+from collections import Counter
+
+from prompt_budget import count_tokens
+
+# Separates pages in extractor output
+PAGE_BREAK = "\f"
+# Non-blank lines at each end of a page checked for repeats
+EDGE_LINES = 3
+# Share of pages a line must be repeated on to be dropped, and the fewest
+# pages that makes a repeat
+REPEAT_MIN_SHARE = 0.5
+REPEAT_MIN_PAGES = 3
+# Longer lines are body text even when repeated
+REPEAT_MAX_CHARS = 200
+
+PAGE_NUMBER_RE = re.compile(r"^[-\u2013(\[]?\s*(\d{1,4})\s*[-\u2013)\]]?$")
+HYPHEN_BREAK_RE = re.compile(r"([a-z])-[ \t]*\n[ \t]*([a-z])")
+SPACES_RE = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u3000]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+CHARACTER_MAP = str.maketrans({
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi",
+    "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+    # Soft hyphen, zero-width space and joiners, byte order mark
+    "\u00ad": None, "\u200b": None, "\u200c": None, "\u200d": None, "\ufeff": None,
+})
+
+
+def line_key(line):
+    """
+    Form of a line compared across pages: lowercased, digits masked and
+    whitespace collapsed
+    """
+    return " ".join(re.sub(r"\d+", "#", line.lower()).split())
+
+
+def edge_lines(lines):
+    """
+    Indices of the first and last EDGE_LINES non-blank lines
+    """
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def repeat_threshold(pages):
+    """
+    Pages a line must appear on to count as repeated; blank pages (OCR of
+    an empty scan) don't raise it
+    """
+    filled = sum(1 for lines in pages if any(line.strip() for line in lines))
+    return max(REPEAT_MIN_PAGES, math.ceil(filled * REPEAT_MIN_SHARE))
+
+
+def repeated_keys(pages):
+    """
+    Frequency index over page edges: keys of the lines repeated on enough
+    pages to be running headers or footers. Bare numbers are left to
+    page_number_lines.
+    """
+    if len(pages) < REPEAT_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        keys = {line_key(lines[i]) for i in edge_lines(lines)
+                if len(lines[i].strip()) <= REPEAT_MAX_CHARS
+                and not PAGE_NUMBER_RE.match(lines[i].strip())}
+        counts.update(k for k in keys if k)
+    threshold = repeat_threshold(pages)
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def page_number_lines(pages):
+    """
+    Indices, per page, of the lines numbering the pages: a bare number on
+    the first or last non-blank line, at the same end and the same offset
+    from the page index on enough pages
+    """
+    found = []
+    for index, lines in enumerate(pages):
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        if not filled:
+            continue
+        for end, i in (("first", filled[0]), ("last", filled[-1])):
+            match = PAGE_NUMBER_RE.match(lines[i].strip())
+            if match:
+                found.append((index, i, (end, int(match.group(1)) - index)))
+    runs = Counter(run for _, _, run in found)
+    threshold = repeat_threshold(pages)
+    numbered = [set() for _ in pages]
+    for index, i, run in found:
+        if runs[run] >= threshold:
+            numbered[index].add(i)
+    return numbered
+
+
+def strip_repeated(pages):
+    """
+    Remove page numbers and repeated edge lines, keeping the first
+    occurrence of each repeated line (a running header is often the
+    document title); returns (pages, lines removed)
+    """
+    repeated = repeated_keys(pages)
+    numbered = page_number_lines(pages)
+    kept_pages, removed, seen = [], 0, set()
+    for lines, numbers in zip(pages, numbered):
+        edges = edge_lines(lines)
+        kept = []
+        for i, line in enumerate(lines):
+            if i in numbers:
+                removed += 1
+                continue
+            if i in edges:
+                key = line_key(line.strip())
+                if key in seen:
+                    removed += 1
+                    continue
+                if key in repeated:
+                    seen.add(key)
+            kept.append(line)
+        kept_pages.append(kept)
+    return kept_pages, removed
+
+
+def clean_spacing(text):
+    """
+    Collapse runs of spaces and blank lines, trimming each line
+    """
+    lines = [SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def normalize(text, report=None):
+    """
+    Normalized text of PAGE_BREAK-separated pages. Characters, lines
+    removed, words rejoined and the bytes and estimated tokens saved are
+    written to `report` if given.
+    """
+    original = (text or "").replace(PAGE_BREAK, "\n")
+    pages = [page.split("\n") for page in (text or "").translate(CHARACTER_MAP).split(PAGE_BREAK)]
+    pages, removed = strip_repeated(pages)
+    joined = "\n".join("\n".join(lines) for lines in pages)
+    joined, rejoined = HYPHEN_BREAK_RE.subn(r"\1\2", joined)
+    result = clean_spacing(joined)
+    if report is not None:
+        report.update({
+            "chars_before": len(original),
+            "chars_after": len(result),
+            "repeated_lines_removed": removed,
+            "words_rejoined": rejoined,
+            "bytes_saved": len(original.encode("utf-8")) - len(result.encode("utf-8")),
+            "tokens_saved": count_tokens(original) - count_tokens(result),
+        })
+    return result
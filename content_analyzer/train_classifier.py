@@ -0,0 +1,123 @@
+"""
+Train the local agreement classifier offline.
+
+The corpus is either a directory with one sub-directory per label holding
+.txt files (text already extracted), or a .jsonl file of
+{"text": ..., "label": ...} records. Labels listed in --positive are
+agreements; every other label is a negative example.
+
+Usage:
+    python train_classifier.py corpus/ [--positive agreement] [--out models/agreement_classifier.npz]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from agreement_model import (
+    AgreementModel, DEFAULT_MODEL_PATH, N_FEATURES, batch_features, features, sigmoid
+)
+
+
+def load_corpus(path):
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return [(r["text"], r["label"]) for r in records]
+    samples = []
+    for label in sorted(os.listdir(path)):
+        label_dir = os.path.join(path, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(label_dir, name), encoding="utf-8", errors="ignore") as f:
+                    samples.append((f.read(), label))
+    return samples
+
+
+def train(docs, labels, epochs, lr, l2, seed):
+    """
+    Logistic regression by per-document SGD with sparse updates
+    """
+    weights, bias = np.zeros(N_FEATURES), 0.0
+    order = list(range(len(docs)))
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        loss = 0.0
+        step = lr / (1 + epoch)
+        for i in order:
+            idx, val = docs[i]
+            p = sigmoid(weights[idx] @ val + bias)
+            y = labels[i]
+            loss -= np.log(p + 1e-12) if y else np.log(1 - p + 1e-12)
+            grad = p - y
+            weights[idx] -= step * (grad * val + l2 * weights[idx])
+            bias -= step * grad
+        print(f"epoch {epoch + 1}: loss {loss / max(1, len(order)):.4f}")
+    return weights, bias
+
+
+def evaluate(model, texts, labels):
+    pred = model.predict(texts)
+    labels = np.asarray(labels, dtype=bool)
+    tp = int((pred & labels).sum())
+    fp = int((pred & ~labels).sum())
+    fn = int((~pred & labels).sum())
+    accuracy = float((pred == labels).mean()) if len(labels) else 0.0
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return accuracy, precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--positive", nargs="+", default=["agreement"])
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--lr", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-6)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    positive = set(args.positive)
+    random.Random(args.seed).shuffle(samples)
+    n_test = int(len(samples) * args.holdout)
+    test, trainset = samples[:n_test], samples[n_test:]
+    print(f"{len(trainset)} training / {len(test)} held-out documents, "
+          f"{sum(1 for _, l in samples if l in positive)} positive")
+
+    docs = [features(text) for text, _ in trainset]
+    labels = [1.0 if label in positive else 0.0 for _, label in trainset]
+    weights, bias = train(docs, labels, args.epochs, args.lr, args.l2, args.seed)
+    model = AgreementModel(weights, bias, args.threshold, {
+        "documents": len(trainset), "positive_labels": sorted(positive)
+    })
+
+    if test:
+        texts = [text for text, _ in test]
+        acc, prec, rec = evaluate(model, texts, [label in positive for _, label in test])
+        print(f"held-out accuracy {acc:.3f} precision {prec:.3f} recall {rec:.3f}")
+        start = time.perf_counter()
+        doc_ids, indices, values = batch_features(texts)
+        featurise = time.perf_counter() - start
+        start = time.perf_counter()
+        model.decision(doc_ids, indices, values, len(texts))
+        score = time.perf_counter() - start
+        print(f"batch of {len(texts)}: featurise {featurise * 1e6 / len(texts):.0f} us/doc, "
+              f"score {score * 1e6 / len(texts):.2f} us/doc")
+
+    model.save(args.out)
+    print(f"Saved model to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
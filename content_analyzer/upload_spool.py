@@ -0,0 +1,121 @@
+"""
+Upload spooling and memory-mapped document access.
+
+Uploads above UPLOAD_SPOOL_THRESHOLD are written by Werkzeug straight into a
+named temp file instead of an anonymous one, so extractors and process-pool
+workers can open the document by path (or memory-map it) instead of copying
+the bytes around. Smaller uploads stay in memory.
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or None
+
+
+class SpooledRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        if total_content_length is None or total_content_length > UPLOAD_SPOOL_THRESHOLD:
+            # Removed by Werkzeug closing the file at the end of the request
+            return tempfile.NamedTemporaryFile(
+                "wb+", prefix="upload-", dir=UPLOAD_SPOOL_DIR)
+        return io.BytesIO()
+
+
+def detach(file):
+    """
+    Move an upload into a FileStorage the request does not own, for
+    streamed responses that read it after the view has returned (newer
+    Flask closes request files at that point). The caller must close it.
+    """
+    owned = FileStorage(stream=file.stream, filename=file.filename, name=file.name,
+                        content_type=file.content_type, headers=file.headers)
+    file.stream = io.BytesIO()
+    return owned
+
+
+def stream_path(file_stream):
+    """
+    Path of the file behind a stream, or None for in-memory streams
+    """
+    name = getattr(file_stream, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def source_of(file_stream):
+    """
+    What extraction workers should open: a path for spooled files, otherwise
+    the bytes of the stream
+    """
+    path = stream_path(file_stream)
+    if path is not None:
+        if hasattr(file_stream, "flush"):
+            file_stream.flush()
+        return path
+    file_stream.seek(0)
+    return file_stream.read()
+
+
+@contextmanager
+def mapped(file_stream):
+    """
+    Read-only memory map of a file-backed stream. In-memory streams (and
+    empty files, which cannot be mapped) are yielded unchanged.
+    """
+    try:
+        fileno = file_stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+    if fileno is None or os.fstat(fileno).st_size == 0:
+        file_stream.seek(0)
+        yield file_stream
+        return
+    if hasattr(file_stream, "flush"):
+        file_stream.flush()
+    view = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        yield view
+    finally:
+        view.close()
+
+
+@contextmanager
+def open_source(source):
+    """
+    File-like view of an extraction source: an mmap for paths, a BytesIO
+    over the bytes otherwise
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            with mapped(f) as view:
+                yield view
+    else:
+        yield io.BytesIO(source)
+
+
+def digest(file_stream, *parts):
+    """
+    content_key-compatible SHA-256 of a stream, hashed through an mmap so
+    spooled uploads are never read into a single bytes object
+    """
+    with mapped(file_stream) as view:
+        if isinstance(view, mmap.mmap):
+            h = hashlib.sha256(view)
+        else:
+            h = hashlib.sha256()
+            for block in iter(lambda: view.read(1024 * 1024), b""):
+                h.update(block)
+            view.seek(0)
+    for part in parts:
+        h.update(b"\0" + str(part).encode("utf-8"))
+    return h.hexdigest()